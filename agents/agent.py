@@ -12,7 +12,7 @@ from langchain_openai import ChatOpenAI
 from langchain.agents import initialize_agent, AgentType, AgentExecutor
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import MessagesPlaceholder
-from langchain.schema import SystemMessage
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
 from tools.langchain_tools import all_tools # Assuming your tools are correctly defined here
 
 # --- LLM and Memory Setup (Corrected) ---
@@ -54,6 +54,7 @@ Examples of phrases that require immediate escalation:
 1. ALWAYS use the appropriate tool for the user's request.
 2. NEVER make up information; use tools to get real data.
 3. When showing order details from `find_orders_by_user`, display ALL available information without summarizing.
+4. For questions about refund, cancellation or replacement policy, use `lookup_policy` before answering; only use `search_web` for information outside company policy.
 """
 
 # Use agent_kwargs to pass the system message and memory variables correctly
@@ -98,12 +99,36 @@ agent: AgentExecutor = initialize_agent(
     early_stopping_method="generate"
 )
 
+# Same agent without the shared memory above. The API runs many turns at once for
+# different conversations, so each call passes its own history instead.
+stateless_agent: AgentExecutor = initialize_agent(
+    tools=all_tools,
+    llm=llm,
+    agent=AgentType.OPENAI_FUNCTIONS,
+    verbose=True,
+    handle_parsing_errors=True,
+    agent_kwargs=agent_kwargs,
+    max_iterations=5,
+    early_stopping_method="generate"
+)
+
+def history_messages(chat_history):
+    """Convert stored {"role", "content"} dicts into chat messages for the prompt."""
+    messages = []
+    for message in chat_history:
+        cls = AIMessage if message.get("role") == "assistant" else HumanMessage
+        messages.append(cls(content=message.get("content") or ""))
+    return messages
+
 # --- Agent Invocation Function (Corrected and Simplified) ---
 
-def agent_act(user_input: str, user_id: int = None):
+def agent_act(user_input: str, user_id: int = None, chat_history=None):
     """
     Invokes the ReAct agent with the user's input.
-    The agent will handle memory and prompt construction internally.
+
+    Without ``chat_history`` the agent keeps its own process-wide memory (the
+    interactive CLI below). Concurrent callers pass the conversation's earlier
+    messages instead, so turns from different users never share memory.
     """
     try:
         if not user_input or not isinstance(user_input, str):
@@ -112,7 +137,11 @@ def agent_act(user_input: str, user_id: int = None):
         contextual_input = f"User Input: '{user_input}'. (Context: user_id is {user_id})"
 
         # Use .invoke() which is the standard method now
-        result = agent.invoke({"input": contextual_input})
+        if chat_history is None:
+            result = agent.invoke({"input": contextual_input})
+        else:
+            result = stateless_agent.invoke({"input": contextual_input,
+                                             "chat_history": history_messages(chat_history)})
 
         # The output from .invoke() is a dictionary, the answer is in the 'output' key
         final_answer = result.get('output', "I'm sorry, I couldn't process that.")
@@ -0,0 +1,133 @@
+"""
+Admission control for /support/resolve.
+
+Every request first takes a token from its user's bucket, then waits for one of
+a fixed number of global agent slots. Requests that are over their rate, find
+the wait queue full, or wait too long for a slot are rejected with
+AdmissionRejected, which the API turns into a 429 with Retry-After.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from api.metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: ``capacity`` burst, refilled at ``rate`` tokens per second."""
+
+    def __init__(self, capacity: float, rate: float, now: float = None):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def try_acquire(self, now: float = None):
+        """Take one token. Returns (True, 0) or (False, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class UserRateLimiter:
+    """Per-user token buckets; the least recently seen users are dropped beyond max_users."""
+
+    def __init__(self, per_minute: float, burst: float, max_users: int = 100000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, user_id: str, now: float = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = TokenBucket(self.burst, self.rate, now)
+                if len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_id)
+            return bucket.try_acquire(now)
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, queue_timeout: float = 10.0,
+                 user_rate_per_minute: float = 20, user_burst: float = 5):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limiter = UserRateLimiter(user_rate_per_minute, user_burst)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+
+    def _reject(self, reason: str, retry_after: float):
+        metrics.incr("admission.rejected")
+        metrics.incr(f"admission.rejected.{reason}")
+        raise AdmissionRejected(reason, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, interactive: bool = True):
+        """
+        Hold one global agent slot for the duration of the block.
+
+        Non-interactive callers (batch items, queued jobs) skip the user's rate limit and
+        wait for a slot without the queue bound or timeout, so they are never
+        rejected but still count against ``max_concurrency``.
+        """
+        if interactive:
+            allowed, retry_after = self.limiter.check(str(user_id))
+            if not allowed:
+                self._reject("rate_limited", retry_after)
+
+        start = time.monotonic()
+        if not self._slots.locked() or not interactive:
+            # A free slot is taken without suspending
+            await self._slots.acquire()
+        else:
+            if self._waiting >= self.max_queue:
+                self._reject("queue_full", self.queue_timeout)
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", self.queue_timeout)
+            finally:
+                self._waiting -= 1
+        metrics.observe("admission.queue_wait_seconds", time.monotonic() - start)
+
+        self._in_flight += 1
+        metrics.incr("admission.admitted")
+        metrics.set_gauge("admission.in_flight", self._in_flight)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            metrics.set_gauge("admission.in_flight", self._in_flight)
+            self._slots.release()
+
+
+def create_admission_controller() -> AdmissionController:
+    return AdmissionController(
+        max_concurrency=int(os.getenv("RESOLVE_MAX_CONCURRENCY", 8)),
+        max_queue=int(os.getenv("RESOLVE_MAX_QUEUE", 32)),
+        queue_timeout=float(os.getenv("RESOLVE_QUEUE_TIMEOUT", 10)),
+        user_rate_per_minute=float(os.getenv("USER_RATE_PER_MINUTE", 20)),
+        user_burst=float(os.getenv("USER_RATE_BURST", 5)),
+    )
@@ -0,0 +1,281 @@
+"""
+Conversation stores for the support API.
+
+CONVERSATION_STORE selects the backend:
+    memory: in-process LRU with TTL and a memory cap (default, single worker only)
+    sqlite: append-only message rows in a WAL-mode SQLite file, shared by all workers on a host
+    redis:  one Redis list per conversation, shared across hosts
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, List, Optional
+
+
+class ConversationStore(ABC):
+    """Interface every store implements. Messages are JSON-serializable dicts."""
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[List[Dict]]:
+        """Return the messages of a conversation, or None if it is unknown or expired."""
+
+    def exists(self, conversation_id: str) -> bool:
+        return self.get(conversation_id) is not None
+
+    def turn_count(self, conversation_id: str) -> int:
+        """Number of messages stored for a conversation (0 if unknown); stores override this cheaply."""
+        return len(self.get(conversation_id) or [])
+
+    @abstractmethod
+    def append(self, conversation_id: str, messages: List[Dict]) -> None:
+        """Append messages to a conversation, creating it if needed."""
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> None:
+        """Forget a conversation; unknown ids are ignored."""
+
+
+class InMemoryConversationStore(ConversationStore):
+    """
+    Per-process store bounded by conversation count, approximate payload bytes and idle TTL.
+
+    The least recently used conversations are evicted first.
+    """
+
+    def __init__(self, max_conversations: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 3600):
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._items = OrderedDict()  # conversation_id -> [messages, size_bytes, last_access]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, entry, now):
+        return self.ttl_seconds and now - entry[2] > self.ttl_seconds
+
+    def _drop(self, conversation_id):
+        entry = self._items.pop(conversation_id, None)
+        if entry:
+            self._bytes -= entry[1]
+
+    def _evict(self, now):
+        # Expired entries sit at the LRU end, so scanning from there stops early
+        while self._items:
+            oldest_id, oldest = next(iter(self._items.items()))
+            if (len(self._items) > self.max_conversations or self._bytes > self.max_bytes
+                    or self._expired(oldest, now)):
+                self._drop(oldest_id)
+            else:
+                break
+
+    def get(self, conversation_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                self._drop(conversation_id)
+                return None
+            entry[2] = now
+            self._items.move_to_end(conversation_id)
+            return list(entry[0])
+
+    def turn_count(self, conversation_id):
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None or self._expired(entry, time.monotonic()):
+                return 0
+            return len(entry[0])
+
+    def append(self, conversation_id, messages):
+        now = time.monotonic()
+        size = sum(len(json.dumps(m, default=str)) for m in messages)
+        with self._lock:
+            entry = self._items.get(conversation_id)
+            if entry is None or self._expired(entry, now):
+                self._drop(conversation_id)
+                entry = self._items[conversation_id] = [[], 0, now]
+            entry[0].extend(messages)
+            entry[1] += size
+            entry[2] = now
+            self._bytes += size
+            self._items.move_to_end(conversation_id)
+            self._evict(now)
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._drop(conversation_id)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Shared store in a WAL-mode SQLite file.
+
+    Each turn inserts only its new message rows; conversations idle for longer than
+    ttl_seconds are treated as missing and purged opportunistically.
+    """
+
+    PURGE_INTERVAL = 300
+
+    def __init__(self, path: str = "conversations.db", ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._last_purge = 0.0
+        # Not cached, so no connection is inherited by forked workers
+        with closing(self._connect()) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conversation (
+                    id TEXT PRIMARY KEY,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS conversation_message (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL REFERENCES conversation(id) ON DELETE CASCADE,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_conversation_message_conv
+                    ON conversation_message (conversation_id, id);
+                CREATE INDEX IF NOT EXISTS ix_conversation_updated ON conversation (updated_at);
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _conn(self):
+        # One connection per thread, reopened after a fork
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            self._local.conn = self._connect()
+            self._local.pid = pid
+        return self._local.conn
+
+    def _cutoff(self):
+        return time.time() - self.ttl_seconds if self.ttl_seconds else 0.0
+
+    def exists(self, conversation_id):
+        row = self._conn().execute(
+            "SELECT 1 FROM conversation WHERE id = ? AND updated_at >= ?",
+            (conversation_id, self._cutoff()),
+        ).fetchone()
+        return row is not None
+
+    def get(self, conversation_id):
+        if not self.exists(conversation_id):
+            return None
+        rows = self._conn().execute(
+            "SELECT payload FROM conversation_message WHERE conversation_id = ? ORDER BY id",
+            (conversation_id,),
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def turn_count(self, conversation_id):
+        if not self.exists(conversation_id):
+            return 0
+        (count,) = self._conn().execute(
+            "SELECT COUNT(*) FROM conversation_message WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return count
+
+    def append(self, conversation_id, messages):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO conversation (id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at",
+                (conversation_id, now),
+            )
+            conn.executemany(
+                "INSERT INTO conversation_message (conversation_id, payload) VALUES (?, ?)",
+                [(conversation_id, json.dumps(m, default=str)) for m in messages],
+            )
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = now
+            self.purge_expired()
+
+    def delete(self, conversation_id):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM conversation WHERE id = ?", (conversation_id,))
+
+    def purge_expired(self):
+        """Remove conversations idle for longer than the TTL. Returns the number removed."""
+        if not self.ttl_seconds:
+            return 0
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM conversation WHERE updated_at < ?", (self._cutoff(),)).rowcount
+
+
+class RedisConversationStore(ConversationStore):
+    """One Redis list per conversation, refreshed to ttl_seconds and trimmed to max_messages on write."""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl_seconds: int = 7 * 24 * 3600,
+                 max_messages: int = 200, prefix: str = "conversation:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.prefix = prefix
+
+    def _key(self, conversation_id):
+        return f"{self.prefix}{conversation_id}"
+
+    def exists(self, conversation_id):
+        return bool(self.client.exists(self._key(conversation_id)))
+
+    def get(self, conversation_id):
+        raw = self.client.lrange(self._key(conversation_id), 0, -1)
+        if not raw:
+            return None
+        return [json.loads(item) for item in raw]
+
+    def turn_count(self, conversation_id):
+        # Counted separately because the list itself is trimmed to max_messages
+        return int(self.client.get(self._key(conversation_id) + ":turns") or 0)
+
+    def append(self, conversation_id, messages):
+        key = self._key(conversation_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *[json.dumps(m, default=str) for m in messages])
+        pipe.incrby(key + ":turns", len(messages))
+        if self.max_messages:
+            pipe.ltrim(key, -self.max_messages, -1)
+        if self.ttl_seconds:
+            pipe.expire(key, int(self.ttl_seconds))
+            pipe.expire(key + ":turns", int(self.ttl_seconds))
+        pipe.execute()
+
+    def delete(self, conversation_id):
+        key = self._key(conversation_id)
+        self.client.delete(key, key + ":turns")
+
+
+def create_conversation_store() -> ConversationStore:
+    """Build the store configured by CONVERSATION_STORE and related env vars."""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    ttl = float(os.getenv("CONVERSATION_TTL_SECONDS", 24 * 3600))
+    if backend == "sqlite":
+        return SQLiteConversationStore(os.getenv("CONVERSATION_DB_PATH", "conversations.db"), ttl_seconds=ttl)
+    if backend == "redis":
+        return RedisConversationStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl_seconds=int(ttl))
+    if backend == "memory":
+        return InMemoryConversationStore(
+            max_conversations=int(os.getenv("CONVERSATION_MAX_ITEMS", 10000)),
+            max_bytes=int(os.getenv("CONVERSATION_MAX_BYTES", 64 * 1024 * 1024)),
+            ttl_seconds=ttl,
+        )
+    raise ValueError(f"Unknown conversation store: {backend}")
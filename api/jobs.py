@@ -0,0 +1,310 @@
+"""
+Durable asynchronous agent jobs.
+
+POST /support/jobs stores a job in SQLite and returns its id at once; a pool of
+worker tasks runs queued jobs through the agent, records the result, and POSTs
+it to the job's callback_url when one was given. A running job's owner
+refreshes its heartbeat while the agent works; jobs left queued, or running
+with a heartbeat older than ``stale_after`` (their process died), are picked
+up again on startup.
+
+Callbacks only go to hosts listed in JOB_CALLBACK_HOSTS (comma-separated;
+"*.example.com" matches subdomains). Entries allow https; prefix one with
+"http://" (e.g. "http://portal.internal") to also allow plain http to that
+internal host. With no list configured, callback_url is refused.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from api.metrics import metrics
+from api.scheduler import DEFAULT_PRIORITY, FairScheduler
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobStore:
+    """Job rows in a WAL-mode SQLite file, readable from every worker process."""
+
+    def __init__(self, path: str = "agent_jobs.db"):
+        self.path = path
+        self._local = threading.local()
+        # Schema setup uses its own connection so nothing is left open to be
+        # inherited by forked workers (gunicorn preload_app)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS agent_job (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    user_id TEXT,
+                    request TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    callback_url TEXT,
+                    callback_status TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS ix_agent_job_status ON agent_job (status, created_at);
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(agent_job)")}
+            if "priority" not in columns:
+                conn.execute("ALTER TABLE agent_job ADD COLUMN priority TEXT NOT NULL DEFAULT 'medium'")
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE agent_job ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE agent_job ADD COLUMN heartbeat_at REAL")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        # Cached per thread and per process: a connection opened before a fork
+        # must never be used by the child
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            self._local.conn = self._connect()
+            self._local.pid = pid
+        return self._local.conn
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, request: Dict[str, Any], callback_url: Optional[str] = None,
+               priority: str = DEFAULT_PRIORITY) -> Dict[str, Any]:
+        job_id = f"job_{uuid.uuid4().hex}"
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO agent_job (id, status, priority, user_id, request, callback_url, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, priority, str(request.get("user_id")), json.dumps(request, default=str),
+                 callback_url, time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM agent_job WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """Atomically move a queued job to running; False if another worker got it first."""
+        now = time.time()
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE agent_job SET status = ?, owner = ?, started_at = ?, heartbeat_at = ?, "
+                "attempts = attempts + 1 WHERE id = ? AND status = ?",
+                (JOB_RUNNING, owner, now, now, job_id, JOB_QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """Mark a running job as still alive; False if it is no longer ours."""
+        with self._conn() as conn:
+            cursor = conn.execute(
+                "UPDATE agent_job SET heartbeat_at = ? WHERE id = ? AND status = ? AND owner IS ?",
+                (time.time(), job_id, JOB_RUNNING, owner),
+            )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE agent_job SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, default=str) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def set_callback_status(self, job_id: str, callback_status: str) -> None:
+        with self._conn() as conn:
+            conn.execute("UPDATE agent_job SET callback_status = ? WHERE id = ?", (callback_status, job_id))
+
+    def recover(self, stale_after: float) -> list:
+        """
+        Requeue running jobs whose heartbeat is older than stale_after and return every queued job.
+
+        Live owners refresh the heartbeat well within stale_after, so only jobs
+        whose process died are run again.
+        """
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE agent_job SET status = ?, owner = NULL "
+                "WHERE status = ? AND coalesce(heartbeat_at, started_at) < ?",
+                (JOB_QUEUED, JOB_RUNNING, time.time() - stale_after),
+            )
+        rows = self._conn().execute(
+            "SELECT * FROM agent_job WHERE status = ? ORDER BY created_at", (JOB_QUEUED,)
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+def callback_url_allowed(url: str, hosts: Iterable[str]) -> bool:
+    """
+    True if ``url``'s host is in ``hosts`` and its scheme is allowed for that entry.
+
+    "example.com" and "*.example.com" (subdomains) allow https only;
+    "http://portal.internal" also allows plain http to that host.
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return False
+    if parts.scheme not in ("https", "http") or not host:
+        return False
+    for allowed in hosts:
+        allowed = allowed.strip().lower()
+        schemes = ("https",)
+        if allowed.startswith("http://"):
+            allowed, schemes = allowed[len("http://"):], ("https", "http")
+        elif allowed.startswith("https://"):
+            allowed = allowed[len("https://"):]
+        allowed = allowed.split("/", 1)[0].split(":", 1)[0]
+        if not allowed or parts.scheme not in schemes:
+            continue
+        if allowed.startswith("*."):
+            if host.endswith(allowed[1:]):
+                return True
+        elif host == allowed:
+            return True
+    return False
+
+
+class JobRunner:
+    """
+    Runs stored jobs on ``workers`` asyncio tasks with ``handler(request_dict) -> result_dict``.
+
+    Queued jobs are ordered by FairScheduler: ticket priority with aging, and
+    weighted fair sharing between users. While a job runs its heartbeat is
+    refreshed every ``heartbeat_interval`` seconds, which must be well below
+    ``stale_after`` so other processes never requeue a live job.
+    """
+
+    CALLBACK_ATTEMPTS = 3
+
+    def __init__(self, store: JobStore, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 workers: int = 4, stale_after: float = 600, aging_seconds: float = 60,
+                 heartbeat_interval: Optional[float] = None, callback_hosts: Iterable[str] = ()):
+        if heartbeat_interval is None:
+            heartbeat_interval = stale_after / 4
+        if not 0 < heartbeat_interval < stale_after:
+            raise ValueError("heartbeat_interval must be positive and below stale_after")
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval
+        self.aging_seconds = aging_seconds
+        self.callback_hosts = list(callback_hosts)
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.queue: FairScheduler = None
+        self._tasks = []
+
+    def callback_allowed(self, url: str) -> bool:
+        return callback_url_allowed(url, self.callback_hosts)
+
+    async def start(self) -> None:
+        self.queue = FairScheduler(aging_seconds=self.aging_seconds)
+        for job in self.store.recover(self.stale_after):
+            self.queue.put_nowait(job)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, request: Dict[str, Any], callback_url: Optional[str] = None,
+                     priority: str = DEFAULT_PRIORITY) -> Dict[str, Any]:
+        job = self.store.create(request, callback_url, FairScheduler.priority_of({"priority": priority}))
+        await self.queue.put(job)
+        metrics.incr("jobs.submitted")
+        metrics.set_gauge("jobs.queue_depth", self.queue.qsize())
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            metrics.set_gauge("jobs.queue_depth", self.queue.qsize())
+            try:
+                await self._run(job)
+            except Exception:
+                logger.exception("Job %s crashed", job["id"])
+            finally:
+                self.queue.task_done()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            if not self.store.heartbeat(job_id, self.owner):
+                logger.warning("Job %s is no longer owned by %s", job_id, self.owner)
+                return
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        if not self.store.claim(job["id"], self.owner):
+            return
+        metrics.observe("jobs.queue_wait_seconds", time.time() - job["created_at"])
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            result = await self.handler(job["request"])
+            status = JOB_SUCCEEDED if result.get("success", True) else JOB_FAILED
+            self.store.finish(job["id"], status, result=result, error=result.get("error"))
+        except Exception as e:
+            status, result = JOB_FAILED, None
+            self.store.finish(job["id"], status, error=str(e))
+        finally:
+            heartbeat.cancel()
+        metrics.incr(f"jobs.{status}")
+        if job.get("callback_url"):
+            await self._notify(self.store.get(job["id"]))
+
+    async def _notify(self, job: Dict[str, Any]) -> None:
+        if not self.callback_allowed(job["callback_url"]):
+            # Stored before the allowlist changed; never post results to an unapproved host
+            self.store.set_callback_status(job["id"], "rejected")
+            return
+        payload = {k: job[k] for k in ("id", "status", "result", "error")}
+        async with httpx.AsyncClient(timeout=10) as client:
+            for attempt in range(self.CALLBACK_ATTEMPTS):
+                try:
+                    response = await client.post(job["callback_url"], json=payload)
+                    if response.status_code < 500:
+                        self.store.set_callback_status(job["id"], str(response.status_code))
+                        return
+                except httpx.HTTPError as e:
+                    logger.warning("Callback for job %s failed: %s", job["id"], e)
+                await asyncio.sleep(2 ** attempt)
+        self.store.set_callback_status(job["id"], "failed")
+        metrics.incr("jobs.callback_failed")
+
+
+def create_job_store() -> JobStore:
+    return JobStore(os.getenv("AGENT_JOB_DB_PATH", "agent_jobs.db"))
+
+
+def callback_hosts_from_env() -> list:
+    return [host for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()]
@@ -1,9 +1,21 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from agents.agent import agent_act
+from tools.lookup_policy import warm_policy_lookup
+from api.conversation_store import create_conversation_store
+from api.admission import AdmissionRejected, create_admission_controller
+from api.metrics import metrics
+from api.singleflight import SingleFlight, resolve_key
+from api.jobs import JobRunner, callback_hosts_from_env, create_job_store
+import os
+import asyncio
+import hmac
 import json
+import math
 import uuid
 import logging
 
@@ -22,6 +34,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def warmup():
+    """Build the policy retriever before serving so the first policy question is not slow."""
+    warm_policy_lookup()
+
 class Message(BaseModel):
     role: str  # 'user' or 'assistant'
     content: str
@@ -50,16 +67,32 @@ class SupportResponse(BaseModel):
     context: Optional[Dict[str, Any]] = None
     metadata: Optional[Dict[str, Any]] = {}
 
-# In-memory conversation store (replace with Redis in production)
-conversation_store = {}
+class JobSubmission(SupportRequest):
+    callback_url: Optional[str] = None
+    priority: str = "medium"  # low / medium / high / critical, as on tickets
+
+class BatchResolveRequest(BaseModel):
+    requests: List[SupportRequest]
+    max_concurrency: Optional[int] = None
+
+# Bounded conversation store; set CONVERSATION_STORE=sqlite or redis to share it across workers
+conversation_store = create_conversation_store()
 
 def get_conversation(conversation_id: str) -> List[Dict]:
     """Get conversation history from store."""
-    return conversation_store.get(conversation_id, [])
+    return conversation_store.get(conversation_id) or []
+
+def append_conversation(conversation_id: str, messages: List[Dict]):
+    """Append the new messages of a turn to the store."""
+    conversation_store.append(conversation_id, messages)
 
-def save_conversation(conversation_id: str, messages: List[Dict]):
-    """Save conversation to store."""
-    conversation_store[conversation_id] = messages
+# Global agent concurrency cap and per-user token buckets (RESOLVE_* / USER_RATE_* env vars)
+admission = create_admission_controller()
+
+# Duplicate in-flight submissions of the same turn share one agent run; a positive
+# RESOLVE_COALESCE_WINDOW also reuses the finished result that many seconds
+resolve_flight = SingleFlight(window=float(os.getenv("RESOLVE_COALESCE_WINDOW", 0)),
+                              metric="resolve.coalesced")
 
 @app.post("/support/resolve", response_model=SupportResponse)
 async def resolve_support(request: Request, req: SupportRequest):
@@ -78,7 +111,90 @@ async def resolve_support(request: Request, req: SupportRequest):
     - needs_clarification: Whether the agent needs more information
     - clarification_prompt: (If needed) Prompt to show the user
     - context: Additional context for the frontend
+
+    Returns 429 with a Retry-After header when the user is over their rate limit
+    or no agent slot frees up in time. Identical in-flight requests (same user,
+    conversation and normalized input) share a single agent run.
+    """
+    async def admitted_resolve():
+        async with admission.slot(str(req.user_id)):
+            return await _resolve(req)
+
+    try:
+        turn = None
+        if resolve_flight.window and req.conversation_id:
+            # Reused results must belong to this turn, not an earlier identical message
+            turn = conversation_store.turn_count(req.conversation_id)
+        key = resolve_key(req.user_id, req.conversation_id, req.user_input, turn)
+        return await resolve_flight.do(key, admitted_resolve)
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": f"Too many requests ({e.reason})"},
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+
+# Upper bound on concurrent agent runs across all batches (BATCH_MAX_CONCURRENCY). Batch
+# items also hold admission slots, so keep it below RESOLVE_MAX_CONCURRENCY to leave
+# room for interactive requests.
+BATCH_MAX_CONCURRENCY = max(1, min(int(os.getenv("BATCH_MAX_CONCURRENCY", 4)), admission.max_concurrency))
+batch_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+# Batches skip per-user rate limits, so they are an operator tool: callers must send
+# "Authorization: Bearer $BATCH_API_TOKEN", and the endpoint is off when it is unset
+BATCH_API_TOKEN = os.getenv("BATCH_API_TOKEN", "")
+
+def batch_authorized(request: Request) -> bool:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return bool(BATCH_API_TOKEN) and scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), BATCH_API_TOKEN.encode())
+
+@app.post("/support/resolve/batch")
+async def resolve_batch(request: Request, batch: BatchResolveRequest):
+    """
+    Resolve many support requests, streaming results back as NDJSON as each finishes.
+
+    Each output line is {"index": i, "result": {...}} in completion order, where
+    index is the request's position in the input. Identical requests (same user,
+    conversation and normalized input) run once; their extra lines carry
+    "duplicate_of" with the index of the request that ran. Batches bypass the
+    per-user rate limit, but every agent call holds a global admission slot and
+    all batches together never run more than BATCH_MAX_CONCURRENCY at once.
+    Requires the BATCH_API_TOKEN bearer token (403 otherwise).
     """
+    if not batch_authorized(request):
+        raise HTTPException(status_code=403, detail="Batch resolution requires a valid BATCH_API_TOKEN")
+    limit = max(1, min(batch.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+
+    groups: Dict[Any, List[int]] = {}
+    for index, item in enumerate(batch.requests):
+        groups.setdefault(resolve_key(item.user_id, item.conversation_id, item.user_input), []).append(index)
+    metrics.incr("batch.requests", len(batch.requests))
+    metrics.incr("batch.deduplicated", len(batch.requests) - len(groups))
+
+    async def run(indices: List[int]):
+        item = batch.requests[indices[0]]
+        async with semaphore, batch_slots, admission.slot(str(item.user_id), interactive=False):
+            return indices, await _resolve(item.copy())
+
+    async def stream():
+        tasks = [asyncio.ensure_future(run(indices)) for indices in groups.values()]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                indices, result = await finished
+                yield json.dumps({"index": indices[0], "result": result}, default=str) + "\n"
+                for duplicate in indices[1:]:
+                    line = {"index": duplicate, "duplicate_of": indices[0], "result": result}
+                    yield json.dumps(line, default=str) + "\n"
+        finally:
+            # Client went away: stop the agent calls that have not started yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+async def _resolve(req: SupportRequest) -> Dict[str, Any]:
+    """Run one support turn through the agent and record it in the conversation store."""
     try:
         # Ensure user_id is provided and convert to string if it's a number
         if not hasattr(req, 'user_id') or req.user_id is None:
@@ -88,27 +204,30 @@ async def resolve_support(request: Request, req: SupportRequest):
         user_id = str(req.user_id)
         
         # Get or create conversation ID
-        if not req.conversation_id or req.conversation_id not in conversation_store:
+        # Earlier turns of this conversation; the agent gets them per call rather
+        # than from shared memory, so concurrent conversations stay separate
+        history = conversation_store.get(req.conversation_id) if req.conversation_id else None
+        if history is None:
             req.conversation_id = f"conv_{uuid.uuid4().hex[:8]}"
-            conversation_history = []
-        else:
-            conversation_history = get_conversation(req.conversation_id)
+            history = []
         
-        # Add user message to conversation history
+        # User message for this turn
         user_message = {
             "role": "user",
             "content": req.user_input,
             "timestamp": None,  # Will be set by the frontend
             "metadata": {}
         }
-        conversation_history.append(user_message)
         
         # Call the agent
         try:
             logger.info(f"Calling agent with user_id: {user_id} (type: {type(user_id)})")
-            agent_response = agent_act(
+            # agent_act blocks on LLM calls; keep it off the event loop
+            agent_response = await run_in_threadpool(
+                agent_act,
                 user_input=req.user_input,
-                user_id=user_id  # Now properly formatted as string
+                user_id=user_id,  # Now properly formatted as string
+                chat_history=history
             )
             
             # Log the response for debugging
@@ -144,10 +263,9 @@ async def resolve_support(request: Request, req: SupportRequest):
                 **agent_response.get('metadata', {})
             }
         }
-        conversation_history.append(assistant_message)
         
-        # Save updated conversation
-        save_conversation(req.conversation_id, conversation_history)
+        # Persist only this turn's messages
+        append_conversation(req.conversation_id, [user_message, assistant_message])
         
         # Prepare the response data
         response_data = {
@@ -180,20 +298,81 @@ async def resolve_support(request: Request, req: SupportRequest):
             "metadata": {"error": error_msg}
         }
 
+async def _run_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    req = SupportRequest(**payload)
+    # Background work: waits behind interactive requests for a global slot
+    async with admission.slot(str(req.user_id), interactive=False):
+        return await _resolve(req)
+
+# Durable job queue drained by JOB_WORKERS tasks per process
+job_runner = JobRunner(create_job_store(), _run_job, workers=int(os.getenv("JOB_WORKERS", 4)),
+                       stale_after=float(os.getenv("JOB_STALE_SECONDS", 600)),
+                       aging_seconds=float(os.getenv("JOB_AGING_SECONDS", 60)),
+                       callback_hosts=callback_hosts_from_env())
+
+@app.on_event("startup")
+async def start_job_runner():
+    await job_runner.start()
+
+@app.on_event("shutdown")
+async def stop_job_runner():
+    await job_runner.stop()
+
+@app.post("/support/jobs", status_code=202)
+async def submit_job(job: JobSubmission):
+    """
+    Queue a support request for asynchronous resolution and return its job id immediately.
+
+    Poll GET /support/jobs/{job_id}, or pass callback_url to receive
+    {"id", "status", "result", "error"} as a POST when the job finishes.
+    callback_url must be on a host in JOB_CALLBACK_HOSTS, over https unless the entry
+    is written "http://host" (422 otherwise).
+    """
+    if job.callback_url and not job_runner.callback_allowed(job.callback_url):
+        raise HTTPException(status_code=422, detail="callback_url host is not allowed")
+    allowed, retry_after = admission.limiter.check(str(job.user_id))
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests (rate_limited)"},
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+    record = await job_runner.submit(job.dict(exclude={"callback_url", "priority"}), job.callback_url,
+                                     priority=job.priority)
+    return {"job_id": record["id"], "status": record["status"], "status_url": f"/support/jobs/{record['id']}"}
+
+@app.get("/support/jobs/queue")
+async def get_job_queue():
+    """Queued job count per priority class in this worker."""
+    return {"depths": job_runner.queue.depths(), "total": job_runner.queue.qsize()}
+
+@app.get("/support/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and, once finished, result of an asynchronous job."""
+    job = job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/conversation/{conversation_id}")
 async def get_conversation_endpoint(conversation_id: str):
     """Get the full conversation history for a given conversation ID."""
-    if conversation_id not in conversation_store:
+    conversation = conversation_store.get(conversation_id)
+    if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return {"conversation": conversation_store[conversation_id]}
+    return {"conversation": conversation}
 
 @app.delete("/conversation/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation."""
-    if conversation_id in conversation_store:
-        del conversation_store[conversation_id]
+    conversation_store.delete(conversation_id)
     return {"status": "success"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Admission, queue wait and rejection metrics for this worker."""
+    return metrics.snapshot()
+
 @app.get("/health")
 async def health():
     """Health check endpoint. Returns status ok if the service is running."""
@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+from typing import Dict
+
+
+class Metrics:
+    """
+    Small in-process metrics registry served as JSON by GET /metrics.
+
+    Counters only go up, gauges hold the last value set, and timings keep
+    count/sum/max plus a bounded window of recent samples for percentiles.
+    """
+
+    WINDOW = 1024
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {"count": 0, "sum": 0.0, "max": 0.0,
+                                                "samples": deque(maxlen=self.WINDOW)}
+            timing["count"] += 1
+            timing["sum"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["samples"].append(seconds)
+
+    @staticmethod
+    def _percentile(ordered, pct):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {}
+            for name, t in self._timings.items():
+                ordered = sorted(t["samples"])
+                timings[name] = {
+                    "count": t["count"],
+                    "sum": round(t["sum"], 6),
+                    "max": round(t["max"], 6),
+                    "p50": round(self._percentile(ordered, 50), 6),
+                    "p99": round(self._percentile(ordered, 99), 6),
+                }
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "timings": timings}
+
+
+metrics = Metrics()
@@ -0,0 +1,128 @@
+"""
+Priority- and fairness-aware queue for agent jobs.
+
+Jobs are split by ticket priority class. Within a class, users are served by
+weighted fair queuing: each job gets a virtual finish tag
+max(class virtual time, user's previous tag) + 1 / weight, and the smallest
+tag runs next. A user who submits a burst gets a run of increasing tags, so
+other users' jobs interleave with it.
+
+Across classes, the head job with the best effective rank runs first. The
+effective rank is the class rank minus one level for every ``aging_seconds``
+the job has waited. Aging can lift a job up to "high" but never to
+"critical", so critical jobs only wait behind other critical work. Ties go to
+the job that has waited longest.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, Optional
+
+from api.metrics import metrics
+
+PRIORITY_CLASSES = ("critical", "high", "medium", "low")
+DEFAULT_PRIORITY = "medium"
+
+
+class _ClassQueue:
+    def __init__(self):
+        self.heap = []  # (finish_tag, seq, enqueued_at, job)
+        self.virtual_time = 0.0
+        self.last_tag: Dict[str, float] = {}
+        self.per_user: Dict[str, int] = {}
+
+    def push(self, job, user, weight, seq, now):
+        tag = max(self.virtual_time, self.last_tag.get(user, 0.0)) + 1.0 / weight
+        self.last_tag[user] = tag
+        self.per_user[user] = self.per_user.get(user, 0) + 1
+        heapq.heappush(self.heap, (tag, seq, now, job))
+
+    def pop(self):
+        tag, _, _, job = heapq.heappop(self.heap)
+        self.virtual_time = tag
+        user = str(job.get("user_id"))
+        self.per_user[user] -= 1
+        if not self.per_user[user]:
+            # An idle user restarts from the class virtual time
+            del self.per_user[user]
+            del self.last_tag[user]
+        return job
+
+
+class FairScheduler:
+    """
+    asyncio.Queue-compatible (put/get/qsize/task_done) scheduler for job dicts
+    carrying "priority" and "user_id".
+    """
+
+    def __init__(self, aging_seconds: float = 60.0, user_weights: Optional[Dict[str, float]] = None):
+        self.aging_seconds = aging_seconds
+        self.user_weights = user_weights or {}
+        self._classes = {name: _ClassQueue() for name in PRIORITY_CLASSES}
+        self._nonempty = asyncio.Event()
+        self._seq = itertools.count()
+        self._size = 0
+
+    @staticmethod
+    def priority_of(job: Dict[str, Any]) -> str:
+        priority = str(job.get("priority") or DEFAULT_PRIORITY).lower()
+        return priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+
+    def put_nowait(self, job: Dict[str, Any]) -> None:
+        user = str(job.get("user_id"))
+        priority = self.priority_of(job)
+        self._classes[priority].push(job, user, self.user_weights.get(user, 1.0),
+                                     next(self._seq), time.monotonic())
+        self._size += 1
+        self._publish_depths()
+        self._nonempty.set()
+
+    async def put(self, job: Dict[str, Any]) -> None:
+        self.put_nowait(job)
+
+    def _effective_rank(self, rank: int, enqueued_at: float, now: float) -> int:
+        if rank == 0 or not self.aging_seconds:
+            return rank
+        return max(1, rank - int((now - enqueued_at) / self.aging_seconds))
+
+    def _select(self, now: float) -> str:
+        best, best_key = None, None
+        for rank, name in enumerate(PRIORITY_CLASSES):
+            heap = self._classes[name].heap
+            if not heap:
+                continue
+            enqueued_at = heap[0][2]
+            key = (self._effective_rank(rank, enqueued_at, now), enqueued_at)
+            if best_key is None or key < best_key:
+                best, best_key = name, key
+        return best
+
+    def get_nowait(self) -> Dict[str, Any]:
+        name = self._select(time.monotonic())
+        if name is None:
+            raise asyncio.QueueEmpty
+        job = self._classes[name].pop()
+        self._size -= 1
+        self._publish_depths()
+        return job
+
+    async def get(self) -> Dict[str, Any]:
+        while not self._size:
+            self._nonempty.clear()
+            await self._nonempty.wait()
+        return self.get_nowait()
+
+    def task_done(self) -> None:
+        pass
+
+    def qsize(self) -> int:
+        return self._size
+
+    def depths(self) -> Dict[str, int]:
+        """Queued jobs per priority class."""
+        return {name: len(self._classes[name].heap) for name in PRIORITY_CLASSES}
+
+    def _publish_depths(self) -> None:
+        for name, depth in self.depths().items():
+            metrics.set_gauge(f"jobs.queue_depth.{name}", depth)
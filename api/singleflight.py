@@ -0,0 +1,73 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from api.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it runs
+    await the same result instead of running it again. Failures are shared
+    with current waiters but never reused afterwards.
+
+    By default nothing is kept once a call finishes. A positive ``window``
+    opts in to reusing a successful result for that many seconds afterwards;
+    the key must then identify the exact request (e.g. include the
+    conversation turn), or a genuine repeat gets the stale answer.
+    """
+
+    def __init__(self, window: float = 0.0, metric: str = "singleflight.coalesced"):
+        self.window = window
+        self.metric = metric
+        self._calls: Dict[Hashable, List] = {}  # key -> [future, finished_at or None]
+
+    def _purge(self, now: float) -> None:
+        expired = [key for key, (_, finished_at) in self._calls.items()
+                   if finished_at is not None and now - finished_at > self.window]
+        for key in expired:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self._purge(time.monotonic())
+        call = self._calls.get(key)
+        if call is not None:
+            metrics.incr(self.metric)
+            # shield: a follower disconnecting must not cancel the leader's work
+            return await asyncio.shield(call[0])
+
+        future = asyncio.get_running_loop().create_future()
+        call = self._calls[key] = [future, None]
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._calls.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._calls.pop(key, None)
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        future.set_result(result)
+        if self.window > 0:
+            call[1] = time.monotonic()
+        else:
+            self._calls.pop(key, None)
+        return result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def resolve_key(user_id, conversation_id, user_input: str, turn=None):
+    """
+    Key for coalescing /support/resolve calls: same user, conversation and normalized text.
+
+    ``turn`` (the conversation's message count) separates a repeated answer such
+    as a second "yes" from a retry of the first; pass it when results are reused
+    after completion.
+    """
+    return (str(user_id), conversation_id or "", " ".join(user_input.lower().split()), turn)
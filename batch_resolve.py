@@ -0,0 +1,80 @@
+"""
+Push a backlog of support requests through POST /support/resolve/batch.
+
+Input is a JSON array or NDJSON file of SupportRequest objects
+({"user_input": ..., "user_id": ..., "conversation_id": ...}); use "-" for stdin.
+Results are written as NDJSON, one line per input request, as they finish.
+
+    BATCH_API_TOKEN=... python batch_resolve.py backlog.ndjson --out results.ndjson --concurrency 4
+"""
+import argparse
+import json
+import os
+import sys
+
+import httpx
+
+DEFAULT_API_URL = os.getenv("AGENT_API_URL", "http://127.0.0.1:8000")
+
+
+def read_requests(path):
+    f = sys.stdin if path == "-" else open(path)
+    try:
+        text = f.read().strip()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def run_batches(requests, api_url, batch_size, concurrency, out, token=None):
+    done = failed = 0
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    with httpx.Client(base_url=api_url, headers=headers, timeout=httpx.Timeout(10.0, read=None)) as client:
+        for offset in range(0, len(requests), batch_size):
+            chunk = requests[offset:offset + batch_size]
+            body = {"requests": chunk, "max_concurrency": concurrency}
+            with client.stream("POST", "/support/resolve/batch", json=body) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    item = json.loads(line)
+                    # Report indices relative to the whole input file
+                    item["index"] += offset
+                    if "duplicate_of" in item:
+                        item["duplicate_of"] += offset
+                    out.write(json.dumps(item) + "\n")
+                    out.flush()
+                    done += 1
+                    if not item["result"].get("success", True):
+                        failed += 1
+            print(f"{done}/{len(requests)} resolved ({failed} failed)", file=sys.stderr)
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSON or NDJSON file of requests, or - for stdin")
+    parser.add_argument("--out", default="-", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    parser.add_argument("--batch-size", type=int, default=500, help="Requests per HTTP call")
+    parser.add_argument("--concurrency", type=int, default=None, help="Concurrent agent runs per batch")
+    parser.add_argument("--token", default=os.getenv("BATCH_API_TOKEN"),
+                        help="Batch API token (default: $BATCH_API_TOKEN)")
+    args = parser.parse_args()
+
+    requests = read_requests(args.input)
+    out = sys.stdout if args.out == "-" else open(args.out, "w")
+    try:
+        _, failed = run_batches(requests, args.api_url, args.batch_size, args.concurrency, out, args.token)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
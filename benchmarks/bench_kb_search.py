@@ -0,0 +1,178 @@
+"""
+Knowledge-base search benchmark: LIKE scan vs the FTS5 article index.
+
+Generates a synthetic corpus (default 100k articles across 10 categories) in a
+temporary SQLite file shaped like the portal's ``article`` table, then reports:
+index build time, database size with and without the index, and per-query
+p50/p99 latency for the old ``title/content LIKE '%q%'`` filter and for
+search_articles(), with and without a category filter. It also times the
+semantic path's exact cosine top-k (VectorIndex) over random unit vectors of
+the embedding model's dimension.
+
+    python benchmarks/bench_kb_search.py --articles 100000 --out benchmarks/results/kb_search.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine, text
+
+from utils.article_search import ensure_article_fts, search_articles
+from utils.vector_index import VectorIndex
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CATEGORIES = 10
+VOCAB = ("vpn network adapter password reset outlook email printer driver laptop battery wifi "
+         "certificate browser cache account locked mfa token sync calendar teams audio camera "
+         "monitor docking station keyboard license install update windows macos linux ssh "
+         "firewall proxy dns timeout disk storage backup restore permission share drive").split()
+QUERIES = ["vpn", "password reset", "printer driver install", "mfa token", "docking station monitor",
+           "outlook calendar sync", "dns timeout", "backup restore", "wifi", "certificate browser"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def make_filler(rng, size=5000):
+    """Pseudo-words standing in for the long tail of an article's vocabulary."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def sentence(rng, filler, words, topic_rate):
+    # Topic terms are rare, so each query matches a realistic fraction of the corpus
+    return " ".join(rng.choice(VOCAB) if rng.random() < topic_rate else rng.choice(filler)
+                    for _ in range(words))
+
+
+def build_corpus(conn, n, seed):
+    rng = random.Random(seed)
+    filler = make_filler(rng)
+    conn.execute(text("CREATE TABLE article (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, "
+                      "content TEXT NOT NULL, summary VARCHAR(500), views INTEGER, helpful_count INTEGER, "
+                      "category_id INTEGER NOT NULL)"))
+    batch = []
+    for i in range(1, n + 1):
+        batch.append({"id": i, "title": sentence(rng, filler, 6, 0.1), "summary": sentence(rng, filler, 20, 0.02),
+                      "content": sentence(rng, filler, 250, 0.004), "category_id": i % CATEGORIES + 1})
+        if len(batch) == 5000:
+            conn.execute(text("INSERT INTO article (id, title, content, summary, views, helpful_count, category_id) "
+                              "VALUES (:id, :title, :content, :summary, 0, 0, :category_id)"), batch)
+            batch = []
+    if batch:
+        conn.execute(text("INSERT INTO article (id, title, content, summary, views, helpful_count, category_id) "
+                          "VALUES (:id, :title, :content, :summary, 0, 0, :category_id)"), batch)
+
+
+def like_search(conn, query, category_id=None, limit=10):
+    """The portal's previous search: a LIKE filter, a COUNT for pagination, then one page."""
+    where = "(title LIKE :q OR content LIKE :q)"
+    if category_id is not None:
+        where += " AND category_id = :category_id"
+    params = {"q": f"%{query}%", "category_id": category_id, "limit": limit}
+    total = conn.execute(text(f"SELECT count(*) FROM article WHERE {where}"), params).scalar()
+    rows = conn.execute(text(f"SELECT id FROM article WHERE {where} ORDER BY id DESC LIMIT :limit"), params).fetchall()
+    return total, rows
+
+
+def time_queries(fn, repeat):
+    latencies = []
+    for query in QUERIES:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return {"p50_ms": round(percentile(latencies, 50), 3), "p99_ms": round(percentile(latencies, 99), 3)}
+
+
+def vector_benchmark(n, dim, repeat, seed):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    index = VectorIndex(capacity=n)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    start = time.perf_counter()
+    for i, vector in enumerate(vectors, start=1):
+        index.upsert(i, vector, group=i % CATEGORIES + 1)
+    load_seconds = time.perf_counter() - start
+    queries = vectors[rng.integers(0, n, len(QUERIES))]
+
+    def timed(group):
+        latencies = []
+        for query in queries:
+            for _ in range(repeat):
+                t = time.perf_counter()
+                index.search(query, k=50, group=group)
+                latencies.append((time.perf_counter() - t) * 1000)
+        return {"p50_ms": round(percentile(latencies, 50), 3), "p99_ms": round(percentile(latencies, 99), 3)}
+
+    return {
+        "dim": dim,
+        "load_seconds": round(load_seconds, 2),
+        "blob_bytes": n * dim * 2,
+        "memory_bytes": n * dim * 4,
+        "topk": timed(None),
+        "topk_category": timed(3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension for the vector benchmark")
+    parser.add_argument("--out", default=os.path.join(HERE, "results", "kb_search.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.db")
+        engine = create_engine(f"sqlite:///{path}")
+        with engine.begin() as conn:
+            start = time.perf_counter()
+            build_corpus(conn, args.articles, args.seed)
+            load_seconds = time.perf_counter() - start
+        size_without_index = os.path.getsize(path)
+
+        with engine.begin() as conn:
+            start = time.perf_counter()
+            ensure_article_fts(conn)
+            index_seconds = time.perf_counter() - start
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+        size_with_index = os.path.getsize(path)
+
+        with engine.connect() as conn:
+            result = {
+                "articles": args.articles,
+                "corpus_load_seconds": round(load_seconds, 2),
+                "index_build_seconds": round(index_seconds, 2),
+                "db_bytes_without_index": size_without_index,
+                "db_bytes_with_index": size_with_index,
+                "like": time_queries(lambda q: like_search(conn, q), args.repeat),
+                "like_category": time_queries(lambda q: like_search(conn, q, category_id=3), args.repeat),
+                "fts": time_queries(lambda q: search_articles(conn, q), args.repeat),
+                "fts_category": time_queries(lambda q: search_articles(conn, q, category_id=3), args.repeat),
+            }
+        engine.dispose()
+    result["vector"] = vector_benchmark(args.articles, args.dim, args.repeat, args.seed)
+
+    print(json.dumps(result, indent=2))
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
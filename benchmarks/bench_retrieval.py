@@ -0,0 +1,136 @@
+"""
+Retrieval quality and latency benchmark for PolicyRetriever.
+
+Runs the labelled queries in benchmarks/policy_queries.json against every
+combination of chunking, retrieval mode and embedding backend, and reports:
+recall@k, MRR, index build time, index size on disk and per-query p50/p99 latency.
+
+A retrieved chunk counts as relevant when it contains one of the query's
+"relevant" snippets, so the labels survive changes to chunk_size/chunk_overlap.
+
+    python benchmarks/bench_retrieval.py --out benchmarks/results/retrieval.json
+    python benchmarks/bench_retrieval.py --modes lexical hybrid --backends onnx
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from rag.embeddings import get_embeddings
+from rag.policy_index import PolicyRetriever
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUERIES = os.path.join(HERE, "policy_queries.json")
+DEFAULT_POLICY_DIR = os.path.join(HERE, "..", "policies")
+CHUNKINGS = [(200, 20), (500, 50), (1000, 100)]
+KS = (1, 2, 4)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def score_query(chunks, relevant, k):
+    """Return (recall@k, reciprocal rank within k) for one query."""
+    top = [c.page_content for c in chunks[:k]]
+    found = sum(1 for snippet in relevant if any(snippet in text for text in top))
+    rr = 0.0
+    for rank, text in enumerate(top, start=1):
+        if any(snippet in text for snippet in relevant):
+            rr = 1.0 / rank
+            break
+    return found / len(relevant), rr
+
+
+def run_config(policy_dir, queries, chunk_size, chunk_overlap, mode, backend, embeddings, repeat):
+    start = time.perf_counter()
+    retriever = PolicyRetriever(policy_dir=policy_dir, mode=mode, warm=False,
+                                chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if mode != "lexical":
+        # Reuse the loaded model so build time measures indexing, not model load
+        retriever._embeddings = lambda: embeddings
+        retriever.warm()
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        retriever.save(tmp)
+        index_bytes = dir_size(tmp)
+
+    max_k = max(KS)
+    latencies = []
+    recall = {k: 0.0 for k in KS}
+    mrr = 0.0
+    for item in queries:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            chunks = retriever.retrieve(item["query"], k=max_k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        for k in KS:
+            recall[k] += score_query(chunks, item["relevant"], k)[0]
+        mrr += score_query(chunks, item["relevant"], max_k)[1]
+
+    n = len(queries)
+    return {
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "mode": mode,
+        "backend": backend if mode != "lexical" else None,
+        "num_chunks": len(retriever.chunks),
+        **{f"recall@{k}": round(recall[k] / n, 4) for k in KS},
+        f"mrr@{max_k}": round(mrr / n, 4),
+        "build_seconds": round(build_seconds, 4),
+        "index_bytes": index_bytes,
+        "latency_ms_p50": round(percentile(latencies, 50), 3),
+        "latency_ms_p99": round(percentile(latencies, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--policy-dir", default=DEFAULT_POLICY_DIR)
+    parser.add_argument("--modes", nargs="+", default=["lexical", "dense", "hybrid"])
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx"])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    parser.add_argument("--out", default=os.path.join(HERE, "results", "retrieval.json"))
+    args = parser.parse_args()
+
+    with open(args.queries) as f:
+        queries = json.load(f)
+
+    backends = {}
+    if any(mode != "lexical" for mode in args.modes):
+        for backend in args.backends:
+            try:
+                backends[backend] = get_embeddings(backend)
+            except Exception as e:
+                print(f"Skipping backend {backend}: {e}", file=sys.stderr)
+
+    results = []
+    for chunk_size, chunk_overlap in CHUNKINGS:
+        for mode in args.modes:
+            configs = [(None, None)] if mode == "lexical" else list(backends.items())
+            for backend, embeddings in configs:
+                result = run_config(args.policy_dir, queries, chunk_size, chunk_overlap,
+                                    mode, backend, embeddings, args.repeat)
+                results.append(result)
+                print(json.dumps(result))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"queries": len(queries), "ks": list(KS), "results": results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Per-worker memory of the policy retriever with and without pre-fork preloading.
+
+Forks 1, 4 and 8 workers the way gunicorn --preload does. Each worker runs one
+query, then the RSS and PSS of every worker is read from /proc. PSS splits
+shared pages between the processes mapping them, so it shows what sharing
+actually saves. Linux only.
+
+    POLICY_INDEX_DIR=.policy_index python benchmarks/bench_worker_memory.py [--out results.json]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+WORKER_COUNTS = (1, 4, 8)
+QUERY = "Can I get a refund within 30 days?"
+
+
+def read_memory_kb(pid):
+    """Return (rss_kb, pss_kb) for a process."""
+    rss = pss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def run_config(workers, preload):
+    """Runs in its own interpreter so configurations do not share state."""
+    from rag.policy_index import get_policy_retriever, preload_policy_retriever
+
+    if preload:
+        preload_policy_retriever()
+    master_rss, master_pss = read_memory_kb(os.getpid())
+
+    children = []
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            get_policy_retriever().retrieve(QUERY)
+            os.write(ready_w, b"1")
+            signal.pause()
+            os._exit(0)
+        os.close(ready_w)
+        children.append((pid, ready_r))
+
+    per_worker = []
+    for pid, ready_r in children:
+        os.read(ready_r, 1)
+        os.close(ready_r)
+    for pid, _ in children:
+        per_worker.append(read_memory_kb(pid))
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    return {
+        "workers": workers,
+        "preload": preload,
+        "master_rss_kb": master_rss,
+        "master_pss_kb": master_pss,
+        "worker_rss_kb": [rss for rss, _ in per_worker],
+        "worker_pss_kb": [pss for _, pss in per_worker],
+        "total_pss_kb": master_pss + sum(pss for _, pss in per_worker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--run", nargs=2, metavar=("WORKERS", "PRELOAD"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_config(int(args.run[0]), args.run[1] == "1")))
+        return
+
+    results = []
+    for workers in WORKER_COUNTS:
+        for preload in (False, True):
+            out = subprocess.run(
+                [sys.executable, __file__, "--run", str(workers), "1" if preload else "0"],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            results.append(result)
+            print(f"workers={workers} preload={preload!s:5} "
+                  f"max worker RSS={max(result['worker_rss_kb']) / 1024:.0f} MiB "
+                  f"total PSS={result['total_pss_kb'] / 1024:.0f} MiB")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
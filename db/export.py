@@ -0,0 +1,113 @@
+"""
+Streaming CSV / NDJSON export of tickets, orders and refunds.
+
+Rows are read through a Core SELECT with ``yield_per`` (a server-side cursor
+where the driver supports one) and serialized one batch at a time, so memory
+stays flat however large the table is. The date range is applied in SQL on
+each table's indexed date column, which is also the sort order.
+
+    with engine.connect() as conn:
+        for chunk in export_chunks(conn, 'orders', 'csv', start=date(2025, 1, 1)):
+            out.write(chunk)
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from .schema import Order, RefundHistory, Ticket
+
+# Dataset name -> (model, date column used for filtering and ordering)
+DATASETS = {
+    'tickets': (Ticket, Ticket.created_at),
+    'orders': (Order, Order.order_date),
+    'refunds': (RefundHistory, RefundHistory.refund_date),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_date(value, end=False):
+    """
+    Parse an ISO date or datetime filter; None/empty means unbounded.
+
+    A bare date as the ``end`` bound covers that whole day, so
+    ``--to 2025-01-31`` includes orders placed on the 31st.
+    """
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        parsed, date_only = datetime(value.year, value.month, value.day), True
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Invalid date {value!r}; expected YYYY-MM-DD or an ISO datetime")
+        date_only = len(value) == 10
+    if end and date_only:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def export_query(dataset, start=None, end=None):
+    """SELECT for one dataset, filtered to ``start <= date < end`` and ordered by date."""
+    try:
+        model, date_column = DATASETS[dataset]
+    except KeyError:
+        raise ValueError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+    query = select(*model.__table__.columns).order_by(date_column, model.id)
+    if start is not None:
+        query = query.where(date_column >= start)
+    if end is not None:
+        query = query.where(date_column < end)
+    return query
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunk(rows, header=None):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(header)
+    writer.writerows([_value(v) for v in row] for row in rows)
+    return buf.getvalue()
+
+
+def export_chunks(conn, dataset, fmt='csv', start=None, end=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield the export as text chunks of about ``batch_size`` rows each.
+
+    ``conn`` is a Connection kept open until the generator is exhausted or
+    closed. The CSV header is sent even when no rows match.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    query = export_query(dataset, start, end)
+    result = conn.execution_options(yield_per=batch_size).execute(query)
+    try:
+        columns = list(result.keys())
+        if fmt == 'csv':
+            yield _csv_chunk((), header=columns)
+        for rows in result.partitions():
+            if fmt == 'csv':
+                yield _csv_chunk(rows)
+            else:
+                yield ''.join(json.dumps({key: _value(value) for key, value in zip(columns, row)}) + '\n'
+                              for row in rows)
+    finally:
+        result.close()
+
@@ -113,6 +113,11 @@ class Order(db.Model):
     user = db.relationship('User', back_populates='orders')
     refunds = db.relationship('RefundHistory', back_populates='order')
     
+    __table_args__ = (
+        # Date-range exports (db/export.py), oldest first
+        db.Index('ix_order_date', 'order_date', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Order {self.id} - {self.status.value}>'
 
@@ -131,6 +136,11 @@ class RefundHistory(db.Model):
     user = db.relationship('User')
     order = db.relationship('Order', back_populates='refunds')
     
+    __table_args__ = (
+        # Date-range exports (db/export.py), oldest first
+        db.Index('ix_refund_date', 'refund_date', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Refund {self.id} - ${self.amount}>'
 
@@ -153,6 +163,13 @@ class Ticket(db.Model):
     # Relationships
     user = db.relationship('User', back_populates='tickets')
     
+    __table_args__ = (
+        # Keyset pagination of a user's tickets, newest first
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at', 'id'),
+        # Date-range exports across all users (db/export.py)
+        db.Index('ix_ticket_created', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Ticket {self.id} - {self.title}>'
 
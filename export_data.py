@@ -0,0 +1,54 @@
+"""
+Export tickets, orders or refunds as CSV or NDJSON, streaming from the database.
+
+Rows are fetched in batches through a server-side cursor and written as they
+arrive, so memory use does not depend on table size. Dates filter on the
+table's own date column (created_at / order_date / refund_date); ``--to``
+with a bare date includes that whole day.
+
+    python export_data.py orders --format csv --from 2025-01-01 --to 2025-03-31 --out q1_orders.csv
+    python export_data.py tickets --format ndjson | gzip > tickets.ndjson.gz
+"""
+import argparse
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+from db.export import DATASETS, DEFAULT_BATCH_SIZE, FORMATS, export_chunks, parse_date
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--from", dest="start", help="first date to include (YYYY-MM-DD or ISO datetime)")
+    parser.add_argument("--to", dest="end", help="last day to include (YYYY-MM-DD), or an exclusive ISO datetime")
+    parser.add_argument("--out", default="-", help="output file, '-' for stdout")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"),
+                        help="defaults to $DATABASE_URL, then the app database")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_date(args.start), parse_date(args.end, end=True)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not args.database_url:
+        from db.schema import DATABASE_URL
+        args.database_url = DATABASE_URL
+    engine = create_engine(args.database_url)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", newline="", encoding="utf-8")
+    try:
+        with engine.connect() as conn:
+            for chunk in export_chunks(conn, args.dataset, args.format, start, end, args.batch_size):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, current_app, jsonify, abort, Response, stream_with_context
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from flask_wtf import FlaskForm, CSRFProtect
 from wtforms import StringField, PasswordField, SubmitField
@@ -10,6 +10,11 @@ from dotenv import load_dotenv
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from db.schema import db, User, Ticket, Order, TicketStatus, OrderStatus
+from db.export import DATASETS, FORMATS, export_chunks, parse_date
+from utils.agent_client import get_agent_client
+from utils.pagination import keyset_paginate
+from utils.user_cache import CachedUserLoader
+from utils.query_stats import init_query_stats
 
 # --- Setup ---
 load_dotenv()
@@ -25,6 +30,7 @@ app.config.update(
 
 csrf, migrate = CSRFProtect(app), Migrate(app, db)
 db.init_app(app)
+init_query_stats(app)
 
 # --- DB & Admin Init ---
 def ensure_admin():
@@ -48,8 +54,10 @@ with app.app_context():
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+user_cache = CachedUserLoader(db, User, ttl=float(os.getenv('USER_CACHE_TTL', 30)))
+
 @login_manager.user_loader
-def load_user(user_id): return User.query.get(int(user_id))
+def load_user(user_id): return user_cache(user_id)
 
 class LoginForm(FlaskForm):
     username, password = StringField('Username', validators=[DataRequired()]), PasswordField('Password', validators=[DataRequired()])
@@ -71,7 +79,9 @@ def login():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
+    tickets = keyset_paginate(Ticket.query.filter_by(user_id=current_user.id), Ticket,
+                              after=request.args.get('after'), before=request.args.get('before'),
+                              per_page=request.args.get('per_page', type=int))
     return render_template('dashboard.html', tickets=tickets)
 
 @app.route('/logout')
@@ -124,7 +134,7 @@ def chat():
     try:
         msg, uid = request.json.get('message', '').strip(), request.json.get('user_id', 'guest')
         if not msg: return jsonify({'response': 'Message cannot be empty'}), 400
-        r = requests.post('http://127.0.0.1:8000/support/resolve', json={'user_input': msg, 'user_id': uid, 'conversation_id': f'chat_{uid}'}, timeout=30)
+        r = get_agent_client().resolve(msg, uid, conversation_id=f'chat_{uid}')
         if r.status_code == 200: return jsonify(r.json())
         return jsonify({'response': f'Error: {r.status_code}'}), 500
     except requests.exceptions.RequestException:
@@ -183,6 +193,26 @@ def place_order():
             flash('Order error. Try again.', 'danger')
     return render_template('place_order.html', form_errors=errors)
 
+# --- Admin export ---
+@app.route('/admin/export/<dataset>')
+@login_required
+def export_data(dataset):
+    """Stream a dataset as CSV or NDJSON: ?format=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD"""
+    if current_user.role != 'admin': abort(403)
+    fmt = request.args.get('format', 'csv')
+    if dataset not in DATASETS or fmt not in FORMATS: abort(404)
+    try: start, end = parse_date(request.args.get('from')), parse_date(request.args.get('to'), end=True)
+    except ValueError as e: return jsonify({'error': str(e)}), 400
+
+    def generate():
+        # The connection lives as long as the response; closing the generator releases it
+        with db.engine.connect() as conn:
+            yield from export_chunks(conn, dataset, fmt, start, end)
+
+    filename = f"{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return Response(stream_with_context(generate()), mimetype=FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 # --- Run ---
 if __name__ == '__main__':
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,23 @@
+# Gunicorn config for the FastAPI agent: gunicorn -c gunicorn.conf.py api.main:app
+#
+# preload_app imports the app in the master; on_starting loads the embedding model
+# and the policy index there too, so forked workers share those pages copy-on-write.
+# (uvicorn --workers spawns fresh interpreters and cannot share them.)
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    if os.getenv("POLICY_INDEX_PRELOAD", "1") == "1":
+        # Only a persisted index (POLICY_INDEX_DIR written by save()) is loaded, so
+        # the master runs no inference; without one preloading is skipped.
+        from rag.policy_index import preload_policy_retriever
+        if preload_policy_retriever() is not None:
+            server.log.info("Policy retriever preloaded in master")
+        else:
+            server.log.warning("No persisted policy index; workers will build it on first use")
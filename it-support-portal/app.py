@@ -1,13 +1,34 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort
+from flask_sqlalchemy import SQLAlchemy, Pagination
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_mail import Mail, Message
 from datetime import datetime
 import os
+import sys
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
-from urllib.parse import urlencode
+import hmac
+import hashlib
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import click
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.agent_client import get_agent_client
+from utils.ttl_cache import TTLCache
+from utils.pagination import keyset_paginate
+from utils.article_search import ensure_article_fts, search_articles
+from utils.counter_buffer import CounterBuffer
+from utils.vector_index import TableVectorIndex
+from utils.redact import redact_pii
+from utils.mail_outbox import MailOutbox, smtp_factory_from_config
+from utils.user_cache import CachedUserLoader
+from utils.query_stats import init_query_stats
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session, joinedload
 
 load_dotenv()
 
@@ -25,10 +46,10 @@ app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 
 db = SQLAlchemy(app)
-mail = Mail(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+init_query_stats(app)
 
 # Database Models
 class User(UserMixin, db.Model):
@@ -61,6 +82,20 @@ class Ticket(db.Model):
     comments = db.relationship('Comment', backref='ticket', lazy=True)
     llm_intent = db.Column(db.String(50))
     llm_action_result = db.Column(db.Text)
+    agent_job_id = db.Column(db.String(64))
+    embedding = db.deferred(db.Column(db.LargeBinary))
+    embedded_at = db.Column(db.Float)
+    # Set when the user accepted an earlier ticket's resolution instead of running the agent
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('ticket.id'))
+
+    __table_args__ = (
+        db.Index('ix_ticket_user_status', 'user_id', 'status'),
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+    @property
+    def agent_pending(self):
+        return bool(self.agent_job_id) and self.llm_action_result is None
 
     @property
     def status_color(self):
@@ -81,12 +116,31 @@ class Ticket(db.Model):
         }
         return colors.get(self.priority, 'secondary')
 
+class TicketArticleSuggestion(db.Model):
+    """Articles most similar to a ticket, precomputed when the ticket is created."""
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class TicketDuplicateMatch(db.Model):
+    """Resolved tickets close to a new ticket, found once when the ticket is created."""
+    ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    source_ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     ticket_id = db.Column(db.Integer, db.ForeignKey('ticket.id'), nullable=False)
+    user = db.relationship('User')
+
+    __table_args__ = (
+        db.Index('ix_comment_ticket_created', 'ticket_id', 'created_at', 'id'),
+    )
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -105,10 +159,484 @@ class Article(db.Model):
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    # float16 unit vector of title + summary + content, see utils/vector_index.py
+    embedding = db.deferred(db.Column(db.LargeBinary))
+    embedded_at = db.Column(db.Float, index=True)
+
+# Skips the per-request user SELECT; evicted on profile/password changes
+user_cache = CachedUserLoader(db, User, ttl=float(os.getenv('USER_CACHE_TTL', 30)))
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache(user_id)
+
+# Comments shown per page of a ticket thread; older ones page in by cursor
+COMMENTS_PER_PAGE = 50
+
+# --- Ticket statistics ---
+# Per-user status counts, computed with one GROUP BY and dropped whenever that
+# user's tickets change in this process; the TTL bounds staleness across workers.
+ticket_stats_cache = TTLCache(ttl=60)
+
+def ticket_stats(user_id):
+    """Return {'open': n, 'in_progress': n, 'resolved': n, 'closed': n, 'total': n} for a user."""
+    def compute():
+        rows = db.session.query(Ticket.status, func.count(Ticket.id))\
+            .filter(Ticket.user_id == user_id)\
+            .group_by(Ticket.status).all()
+        stats = {'open': 0, 'in_progress': 0, 'resolved': 0, 'closed': 0}
+        stats.update({status: count for status, count in rows})
+        stats['total'] = sum(count for _, count in rows)
+        return stats
+    return ticket_stats_cache.get_or_set(user_id, compute)
+
+@event.listens_for(Ticket, 'after_insert')
+@event.listens_for(Ticket, 'after_update')
+@event.listens_for(Ticket, 'after_delete')
+def _ticket_changed(mapper, connection, target):
+    Session.object_session(target).info.setdefault('ticket_stats_users', set()).add(target.user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_ticket_stats(session):
+    # After commit, so a concurrent request cannot re-cache pre-commit counts
+    for user_id in session.info.pop('ticket_stats_users', ()):
+        ticket_stats_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_ticket_stats_changes(session):
+    session.info.pop('ticket_stats_users', None)
+
+# --- Knowledge base search ---
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+@app.before_first_request
+def init_article_search():
+    # The FTS5 index and its sync triggers live in the database itself
+    if fts_enabled():
+        ensure_article_fts(db.session)
+        db.session.commit()
+
+# --- Semantic article search ---
+# Article embeddings are computed once per save on a background thread and
+# stored in the article row; every process mirrors them in memory for top-k.
+SEMANTIC_SEARCH = os.getenv('SEMANTIC_SEARCH', '1') == '1'
+TITLE_MATCH_BOOST = 0.2
+SEARCH_CANDIDATES = 50
+
+_embedder = None
+_embedder_lock = threading.Lock()
+embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+
+def get_embedder():
+    """The shared rag.embeddings backend, or None when semantic search is off or unavailable."""
+    global _embedder
+    if not SEMANTIC_SEARCH:
+        return None
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                try:
+                    from rag.embeddings import get_embeddings
+                    _embedder = get_embeddings()
+                except Exception:
+                    app.logger.exception('Embedding backend unavailable; semantic search disabled')
+                    _embedder = False
+    return _embedder or None
+
+def embed_texts(texts):
+    return np.asarray(get_embedder().embed_documents(texts), dtype=np.float32)
+
+article_index = TableVectorIndex(
+    'article', "title || ' ' || coalesce(summary, '') || ' ' || content",
+    embed_texts, group_column='category_id')
+
+def run_embedding_job(job, *args, executor=None):
+    """Run job(conn, *args) on the embedding thread (or ``executor``), in its own transaction."""
+    def run():
+        if get_embedder() is None:
+            return
+        with app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    return job(conn, *args)
+            except Exception:
+                app.logger.exception('Embedding job %s%r failed', job.__name__, args)
+    return (executor or embedding_executor).submit(run)
+
+def semantic_query_vector(search):
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    vector = np.asarray(embedder.embed_query(search), dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+def hybrid_article_search(search, query_vector, category_id=None):
+    """
+    Rank articles by cosine similarity to the query, boosted by the share of
+    query words in the title. Candidates are the vector top-k plus the FTS
+    top-k, so exact keyword hits are never lost. Returns (ids, fts_hits).
+    """
+    with db.engine.connect() as conn:
+        article_index.sync(conn)
+    scores = dict(article_index.index.search(query_vector, k=SEARCH_CANDIDATES, group=category_id))
+    hits = {}
+    if fts_enabled():
+        _, results = search_articles(db.session, search, category_id=category_id, limit=SEARCH_CANDIDATES)
+        hits = {hit['id']: hit for hit in results}
+        scores.update(article_index.index.scores(query_vector, [i for i in hits if i not in scores]))
+    candidates = set(scores) | set(hits)
+    if not candidates:
+        return [], hits
+    query = db.session.query(Article.id, Article.title).filter(Article.id.in_(candidates))
+    if category_id is not None:
+        query = query.filter(Article.category_id == category_id)
+    titles = dict(query.all())
+    words = set(re.findall(r'\w+', search.lower()))
+
+    def rank(article_id):
+        title_words = set(re.findall(r'\w+', titles[article_id].lower()))
+        overlap = len(words & title_words) / len(words) if words else 0.0
+        return scores.get(article_id, 0.0) + TITLE_MATCH_BOOST * overlap
+
+    return sorted(titles, key=rank, reverse=True), hits
+
+@event.listens_for(Article, 'after_insert')
+def _article_inserted(mapper, connection, target):
+    Session.object_session(target).info.setdefault('articles_to_embed', set()).add(target.id)
+
+@event.listens_for(Article, 'after_update')
+def _article_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ('title', 'summary', 'content')):
+        Session.object_session(target).info.setdefault('articles_to_embed', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _embed_saved_articles(session):
+    article_ids = session.info.pop('articles_to_embed', None)
+    if article_ids and SEMANTIC_SEARCH:
+        run_embedding_job(article_index.embed_rows, sorted(article_ids))
+
+@event.listens_for(Article, 'after_delete')
+def _article_deleted(mapper, connection, target):
+    Session.object_session(target).info.setdefault('articles_deleted', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_deleted_article_vectors(session):
+    # Other processes drop them on their next sync
+    for article_id in session.info.pop('articles_deleted', ()):
+        article_index.index.remove(article_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_articles_to_embed(session):
+    session.info.pop('articles_to_embed', None)
+    session.info.pop('articles_deleted', None)
+
+@app.cli.command('embed-articles')
+@click.option('--all', 'include_embedded', is_flag=True, help='Re-embed articles that already have an embedding.')
+@click.option('--batch-size', default=256, show_default=True)
+def embed_articles_command(include_embedded, batch_size):
+    """Backfill article embeddings for semantic knowledge-base search."""
+    if get_embedder() is None:
+        raise click.ClickException('No embedding backend available (check SEMANTIC_SEARCH and EMBEDDING_BACKEND).')
+    total = article_index.backfill(db.engine.begin, include_embedded, batch_size,
+                                   progress=lambda done, count: click.echo(f'{done}/{count}'))
+    click.echo(f'Embedded {total} articles')
+
+# --- Ticket article suggestions ---
+ARTICLE_SUGGESTIONS = 5
+
+ticket_index = TableVectorIndex('ticket', "title || ' ' || description", embed_texts)
+
+def ticket_vectors(conn, ticket_ids):
+    """Vectors for tickets, embedding only those this process has not seen yet."""
+    vectors = {ticket_id: ticket_index.index.vector(ticket_id) for ticket_id in ticket_ids}
+    missing = [ticket_id for ticket_id, vector in vectors.items() if vector is None]
+    vectors.update(ticket_index.embed_rows(conn, missing))
+    return {ticket_id: vector for ticket_id, vector in vectors.items() if vector is not None}
+
+def suggest_articles(conn, ticket_ids):
+    """Embed tickets and store their nearest articles in ticket_article_suggestion."""
+    vectors = ticket_vectors(conn, ticket_ids)
+    article_index.sync(conn)
+    suggestions = TicketArticleSuggestion.__table__
+    rows = [{'ticket_id': ticket_id, 'rank': rank, 'article_id': article_id, 'score': score}
+            for ticket_id, vector in vectors.items()
+            for rank, (article_id, score) in enumerate(article_index.index.search(vector, k=ARTICLE_SUGGESTIONS), 1)]
+    conn.execute(suggestions.delete().where(suggestions.c.ticket_id.in_(list(vectors))))
+    if rows:
+        conn.execute(suggestions.insert(), rows)
+
+def suggested_articles(ticket, limit=3):
+    """Precomputed related articles for a ticket, falling back to the most recent ones."""
+    related = db.session.query(Article.id, Article.title, Article.summary)\
+        .join(TicketArticleSuggestion, TicketArticleSuggestion.article_id == Article.id)\
+        .filter(TicketArticleSuggestion.ticket_id == ticket.id)\
+        .order_by(TicketArticleSuggestion.rank)\
+        .limit(limit).all()
+    return related or recent_articles(limit)
+
+@event.listens_for(Ticket, 'after_insert')
+def _ticket_inserted(mapper, connection, target):
+    Session.object_session(target).info.setdefault('tickets_to_embed', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _suggest_articles_for_new_tickets(session):
+    ticket_ids = session.info.pop('tickets_to_embed', None)
+    if ticket_ids and SEMANTIC_SEARCH:
+        run_embedding_job(suggest_articles, sorted(ticket_ids))
+
+@event.listens_for(Ticket, 'after_delete')
+def _ticket_deleted(mapper, connection, target):
+    Session.object_session(target).info.setdefault('tickets_deleted', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_deleted_ticket_vectors(session):
+    for ticket_id in session.info.pop('tickets_deleted', ()):
+        ticket_index.index.remove(ticket_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_tickets_to_embed(session):
+    session.info.pop('tickets_to_embed', None)
+    session.info.pop('tickets_deleted', None)
+
+@app.cli.command('suggest-articles')
+@click.option('--all', 'include_embedded', is_flag=True, help='Recompute suggestions for every ticket.')
+@click.option('--batch-size', default=256, show_default=True)
+def suggest_articles_command(include_embedded, batch_size):
+    """Backfill ticket embeddings and related-article suggestions."""
+    if get_embedder() is None:
+        raise click.ClickException('No embedding backend available (check SEMANTIC_SEARCH and EMBEDDING_BACKEND).')
+    with db.engine.connect() as conn:
+        ticket_ids = ticket_index.pending_ids(conn, include_embedded)
+    for start in range(0, len(ticket_ids), batch_size):
+        with db.engine.begin() as conn:
+            suggest_articles(conn, ticket_ids[start:start + batch_size])
+        click.echo(f'{min(start + batch_size, len(ticket_ids))}/{len(ticket_ids)}')
+    click.echo(f'Suggested articles for {len(ticket_ids)} tickets')
+
+# --- Duplicate tickets ---
+# A new ticket close enough to an already-resolved one is offered that
+# resolution before any agent job is queued, which keeps incident spikes of
+# near-identical tickets off the agent. Matching runs once per ticket, on the
+# embedding thread, and is stored in ticket_duplicate_match; the result page
+# only reads it back.
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_TICKET_THRESHOLD', 0.9))
+DUPLICATE_CANDIDATES = 20
+DUPLICATE_MATCHES = 3
+# How long new_ticket waits for matching before queueing the agent anyway
+DUPLICATE_CHECK_TIMEOUT = float(os.getenv('DUPLICATE_CHECK_TIMEOUT', 2))
+# Requests wait on duplicate checks, so they get their own threads rather than
+# queueing behind article re-embeds and suggestion lookups on embedding_executor
+duplicate_executor = ThreadPoolExecutor(max_workers=int(os.getenv('DUPLICATE_CHECK_WORKERS', 2)),
+                                        thread_name_prefix='dedup')
+
+# Written to agent_job_id while a submission is in flight, so only one request submits
+AGENT_JOB_CLAIMED = 'claimed'
+
+TicketMatch = namedtuple('TicketMatch', 'ticket score own resolution')
+
+def _reusable_resolution(query):
+    return query.filter(Ticket.status.in_(['resolved', 'closed']),
+                        Ticket.llm_action_result.isnot(None),
+                        ~Ticket.llm_action_result.like('Agent%error%'))
+
+def store_duplicate_matches(conn, ticket_id):
+    """Find resolved tickets similar to a new one and store them; returns the number stored."""
+    vector = ticket_vectors(conn, [ticket_id]).get(ticket_id)
+    if vector is None:
+        return 0
+    ticket_index.sync(conn)
+    scores = {match_id: score
+              for match_id, score in ticket_index.index.search(vector, k=DUPLICATE_CANDIDATES, exclude=[ticket_id])
+              if score >= DUPLICATE_THRESHOLD}
+    if not scores:
+        return 0
+    resolved = _reusable_resolution(select(Ticket.id).filter(Ticket.id.in_(scores)))
+    candidate_ids = [row.id for row in conn.execute(resolved)]
+    best = sorted(candidate_ids, key=scores.get, reverse=True)[:DUPLICATE_MATCHES]
+    matches = TicketDuplicateMatch.__table__
+    conn.execute(matches.delete().where(matches.c.ticket_id == ticket_id))
+    if best:
+        conn.execute(matches.insert(), [{'ticket_id': ticket_id, 'rank': rank, 'source_ticket_id': match_id,
+                                         'score': scores[match_id]}
+                                        for rank, match_id in enumerate(best, 1)])
+    return len(best)
+
+def check_for_duplicates(ticket):
+    """Run duplicate matching for a new ticket on the duplicate-check threads; True if any were found."""
+    if get_embedder() is None:
+        return False
+    future = run_embedding_job(store_duplicate_matches, ticket.id, executor=duplicate_executor)
+    try:
+        return bool(future.result(timeout=DUPLICATE_CHECK_TIMEOUT))
+    except FutureTimeout:
+        app.logger.warning('Duplicate check for ticket %s timed out; queueing the agent', ticket.id)
+        return False
+
+def resolved_duplicates(ticket):
+    """Stored matches for ``ticket`` whose source is still resolved with a reusable result, best first."""
+    rows = _reusable_resolution(
+        db.session.query(Ticket, TicketDuplicateMatch.score)
+        .join(TicketDuplicateMatch, TicketDuplicateMatch.source_ticket_id == Ticket.id)
+        .filter(TicketDuplicateMatch.ticket_id == ticket.id)
+    ).order_by(TicketDuplicateMatch.rank).all()
+    matches = []
+    for match, score in rows:
+        own = match.user_id == ticket.user_id
+        resolution = match.llm_action_result if own else redact_pii(match.llm_action_result)
+        matches.append(TicketMatch(match, score, own, resolution))
+    return matches
+
+def _unhandled(ticket_id):
+    return db.session.query(Ticket).filter(Ticket.id == ticket_id,
+                                           Ticket.agent_job_id.is_(None),
+                                           Ticket.llm_action_result.is_(None))
+
+def reuse_resolution(ticket, match):
+    """Copy an earlier ticket's resolution onto a still-unhandled ticket; False if it was handled meanwhile."""
+    updated = _unhandled(ticket.id).update({
+        Ticket.duplicate_of_id: match.ticket.id,
+        Ticket.llm_intent: match.ticket.llm_intent,
+        Ticket.llm_action_result: match.resolution,
+    }, synchronize_session=False)
+    db.session.commit()
+    return updated == 1
+
+def submit_ticket_to_agent(ticket):
+    """
+    Queue the ticket with the FastAPI agent; the result arrives via agent_job_callback.
+
+    The ticket is claimed with a conditional UPDATE first, so concurrent
+    requests queue at most one job. Returns False if it was already handled.
+    """
+    claimed = _unhandled(ticket.id).update({Ticket.agent_job_id: AGENT_JOB_CLAIMED}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return False
+    try:
+        client = get_agent_client()
+        user_input = f"{ticket.title}: {ticket.description}"
+        response = client.submit_job(
+            user_input,
+            ticket.user_id,
+            priority=ticket.priority,
+            callback_url=url_for('agent_job_callback', ticket_id=ticket.id,
+                                 token=agent_callback_token(ticket.id), _external=True)
+        )
+        if response.status_code == 422:
+            # The API does not allow callbacks to this host (JOB_CALLBACK_HOSTS);
+            # queue without one and let the result page poll for the outcome
+            app.logger.warning('Agent API refused the callback URL; relying on status polling')
+            response = client.submit_job(user_input, ticket.user_id, priority=ticket.priority)
+        if response.status_code == 202:
+            ticket.agent_job_id = response.json()['job_id']
+        else:
+            ticket.llm_action_result = f'Agent API error: {response.status_code}'
+    except Exception as e:
+        ticket.llm_action_result = f'Agent API error: {e}'
+    db.session.commit()
+    return True
+
+# --- Mail outbox ---
+_mail_outbox = None
+_mail_outbox_lock = threading.Lock()
+
+def get_mail_outbox():
+    """Process-wide MailOutbox delivering through the MAIL_* SMTP settings."""
+    global _mail_outbox
+    if _mail_outbox is None:
+        with _mail_outbox_lock:
+            if _mail_outbox is None:
+                _mail_outbox = MailOutbox(
+                    db.engine,
+                    smtp_factory_from_config(app.config),
+                    default_sender=app.config.get('MAIL_DEFAULT_SENDER'),
+                    batch_size=int(os.getenv('MAIL_OUTBOX_BATCH_SIZE', 20)),
+                    max_attempts=int(os.getenv('MAIL_OUTBOX_MAX_ATTEMPTS', 6)),
+                )
+    return _mail_outbox
+
+@app.before_first_request
+def start_mail_outbox():
+    # Messages queued by an earlier process are picked up without waiting for a new one
+    get_mail_outbox().start()
+
+# --- Article counters ---
+# views/helpful_count increments are buffered per process and written in one
+# batched UPDATE, so popular articles do not take the SQLite write lock per hit
+def flush_article_counters(batch):
+    rows = [{'id': article_id,
+             'views': fields.get('views', 0),
+             'helpful': fields.get('helpful_count', 0)}
+            for article_id, fields in batch.items()]
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text('UPDATE article SET views = coalesce(views, 0) + :views, '
+                              'helpful_count = coalesce(helpful_count, 0) + :helpful WHERE id = :id'), rows)
+
+article_counters = CounterBuffer(
+    flush_article_counters,
+    interval=float(os.getenv('ARTICLE_COUNTER_FLUSH_SECONDS', 5)),
+    threshold=int(os.getenv('ARTICLE_COUNTER_FLUSH_THRESHOLD', 500)),
+)
+
+# --- Article panels ---
+# Popular/recent/related article lists are the same for every user and change
+# rarely, so they are cached as plain tuples (safe to share across sessions)
+# and dropped whenever an article is published, edited or removed.
+ArticleLink = namedtuple('ArticleLink', 'id title summary')
+article_panel_cache = TTLCache(ttl=float(os.getenv('ARTICLE_PANEL_TTL', 60)))
+
+def _article_links(query, limit):
+    return [ArticleLink(a.id, a.title, a.summary)
+            for a in query.with_entities(Article.id, Article.title, Article.summary).limit(limit).all()]
+
+def popular_articles(limit=3):
+    return article_panel_cache.get_or_set(
+        ('popular', limit), lambda: _article_links(Article.query.order_by(Article.views.desc()), limit))
+
+def recent_articles(limit=3):
+    return article_panel_cache.get_or_set(
+        ('recent', limit), lambda: _article_links(Article.query.order_by(Article.created_at.desc()), limit))
+
+def related_articles_for(article, limit=3):
+    # One entry per category; fetch one extra so the current article can be skipped
+    links = article_panel_cache.get_or_set(
+        ('related', article.category_id, limit),
+        lambda: _article_links(Article.query.filter_by(category_id=article.category_id)
+                               .order_by(Article.views.desc()), limit + 1))
+    return [link for link in links if link.id != article.id][:limit]
+
+@event.listens_for(Article, 'after_insert')
+@event.listens_for(Article, 'after_update')
+@event.listens_for(Article, 'after_delete')
+def _article_changed(mapper, connection, target):
+    Session.object_session(target).info['article_panels_dirty'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_article_panels(session):
+    if session.info.pop('article_panels_dirty', False):
+        article_panel_cache.clear()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_article_changes(session):
+    session.info.pop('article_panels_dirty', None)
+
+# --- Agent job helpers ---
+def agent_callback_token(ticket_id):
+    """Signs callback URLs so only the agent API can post results for a ticket."""
+    return hmac.new(app.config['SECRET_KEY'].encode(), f'ticket:{ticket_id}'.encode(), hashlib.sha256).hexdigest()
+
+def apply_agent_result(ticket, job):
+    """Completion handler: copy a finished agent job's outcome onto its ticket."""
+    result = job.get('result') or {}
+    ticket.llm_intent = result.get('intent') or (result.get('metadata') or {}).get('intent')
+    if job.get('status') == 'succeeded':
+        ticket.llm_action_result = str(result.get('action_result') or result.get('response'))
+    else:
+        ticket.llm_action_result = f"Agent error: {job.get('error') or result.get('error') or 'unknown error'}"
+    db.session.commit()
 
 # Routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -174,29 +702,49 @@ def register():
 @app.route('/')
 @login_required
 def dashboard():
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
-    open_tickets_count = Ticket.query.filter_by(user_id=current_user.id, status='open').count()
-    resolved_tickets_count = Ticket.query.filter_by(user_id=current_user.id, status='resolved').count()
-    in_progress_tickets_count = Ticket.query.filter_by(user_id=current_user.id, status='in_progress').count()
-    total_tickets_count = Ticket.query.filter_by(user_id=current_user.id).count()
-    
-    popular_articles = Article.query.order_by(Article.views.desc()).limit(3).all()
+    tickets = keyset_paginate(Ticket.query.filter_by(user_id=current_user.id), Ticket,
+                              after=request.args.get('after'), before=request.args.get('before'),
+                              per_page=request.args.get('per_page', type=int), default_per_page=6)
+    stats = ticket_stats(current_user.id)
     
     return render_template('dashboard.html',
                          tickets=tickets,
-                         open_tickets_count=open_tickets_count,
-                         resolved_tickets_count=resolved_tickets_count,
-                         in_progress_tickets_count=in_progress_tickets_count,
-                         total_tickets_count=total_tickets_count,
-                         popular_articles=popular_articles)
+                         open_tickets_count=stats['open'],
+                         resolved_tickets_count=stats['resolved'],
+                         in_progress_tickets_count=stats['in_progress'],
+                         total_tickets_count=stats['total'],
+                         popular_articles=popular_articles())
 
 @app.route('/ticket/<int:ticket_id>/llm-result', methods=['GET', 'POST'])
 @login_required
 def ticket_llm_result(ticket_id):
     ticket = Ticket.query.get_or_404(ticket_id)
     agent_result = None
+    awaiting_choice = not ticket.agent_job_id and ticket.llm_action_result is None
+    duplicates = resolved_duplicates(ticket) if awaiting_choice else []
     if request.method == 'POST':
         choice = request.form.get('choice')
+        if choice in ('reuse', 'run_agent'):
+            if ticket.user_id != current_user.id or not awaiting_choice:
+                flash('This ticket has already been handled.', 'info')
+                return redirect(url_for('ticket_llm_result', ticket_id=ticket.id))
+            if choice == 'reuse':
+                match = next((m for m in duplicates
+                              if m.ticket.id == request.form.get('source_ticket_id', type=int)), None)
+                if match is not None:
+                    handled = reuse_resolution(ticket, match)
+                elif duplicates:
+                    flash('That resolution is no longer available.', 'warning')
+                    return redirect(url_for('ticket_llm_result', ticket_id=ticket.id))
+                else:
+                    # Every earlier match was reopened or removed since the ticket was filed
+                    flash('The earlier resolution is no longer available, so the AI agent is looking at your ticket.', 'info')
+                    handled = submit_ticket_to_agent(ticket)
+            else:
+                handled = submit_ticket_to_agent(ticket)
+            if not handled:
+                flash('This ticket has already been handled.', 'info')
+            return redirect(url_for('ticket_llm_result', ticket_id=ticket.id))
         if choice == 'satisfied':
             # Mark ticket as resolved
             ticket.status = 'resolved'
@@ -204,31 +752,58 @@ def ticket_llm_result(ticket_id):
             flash('Thank you for your feedback! Ticket marked as resolved.', 'success')
             return redirect(url_for('my_tickets'))
         elif choice == 'escalate':
-            # Send email notification for escalation
-            try:
-                msg = Message(
-                    'Support Ticket Escalation Request',
-                    recipients=[current_user.email]
-                )
-                msg.body = f'''
-                Your support ticket has been escalated to a human agent.
-                
-                Ticket Details:
-                - Ticket ID: {ticket.id}
-                - Title: {ticket.title}
-                - Description: {ticket.description}
-                - Priority: {ticket.priority}
-                
-                A human agent will contact you within 24 hours.
-                '''
-                mail.send(msg)
-                flash('Your request has been escalated. A human agent will contact you via email.', 'info')
-            except Exception as e:
-                flash('Escalation request received. A human agent will contact you soon.', 'info')
+            # Queue the escalation notice; the outbox sender delivers it in the background
+            get_mail_outbox().enqueue(
+                'Support Ticket Escalation Request',
+                [current_user.email],
+                f'''Your support ticket has been escalated to a human agent.
+
+Ticket Details:
+- Ticket ID: {ticket.id}
+- Title: {ticket.title}
+- Description: {ticket.description}
+- Priority: {ticket.priority}
+
+A human agent will contact you within 24 hours.
+'''
+            )
+            flash('Your request has been escalated. A human agent will contact you via email.', 'info')
             return redirect(url_for('my_tickets'))
-    # Retrieve LLM result from flash or session (for demo, use flash messages)
     agent_result = request.args.get('agent_result')
-    return render_template('ticket_llm_result.html', ticket=ticket, agent_result=agent_result)
+    return render_template('ticket_llm_result.html', ticket=ticket, agent_result=agent_result,
+                           duplicates=duplicates, awaiting_choice=awaiting_choice)
+
+@app.route('/ticket/<int:ticket_id>/agent-callback', methods=['POST'])
+def agent_job_callback(ticket_id):
+    """Webhook called by the agent API when a ticket's job finishes."""
+    if not hmac.compare_digest(request.args.get('token', ''), agent_callback_token(ticket_id)):
+        return jsonify({'error': 'Invalid token'}), 403
+    ticket = Ticket.query.get_or_404(ticket_id)
+    job = request.get_json(silent=True) or {}
+    if job.get('id') != ticket.agent_job_id:
+        return jsonify({'error': 'Unknown job'}), 409
+    apply_agent_result(ticket, job)
+    return jsonify({'status': 'ok'})
+
+@app.route('/ticket/<int:ticket_id>/agent-status')
+@login_required
+def ticket_agent_status(ticket_id):
+    """Polled by the result page; falls back to asking the API if the callback has not arrived."""
+    ticket = Ticket.query.get_or_404(ticket_id)
+    if ticket.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Access denied'}), 403
+    if ticket.agent_pending:
+        try:
+            response = get_agent_client().get_job(ticket.agent_job_id)
+            if response.status_code == 200 and response.json().get('status') in ('succeeded', 'failed'):
+                apply_agent_result(ticket, response.json())
+        except requests.exceptions.RequestException:
+            pass
+    return jsonify({
+        'done': not ticket.agent_pending,
+        'llm_intent': ticket.llm_intent,
+        'llm_action_result': ticket.llm_action_result
+    })
 
 @app.route('/ticket/new', methods=['GET', 'POST'])
 @login_required
@@ -243,42 +818,31 @@ def new_ticket():
         db.session.add(ticket)
         db.session.commit()
 
-        # Send to FastAPI agent
-        import requests
-        agent_result = None
-        try:
-            response = requests.post(
-                'http://127.0.0.1:8000/support/resolve',
-                json={'user_input': f"{ticket.title}: {ticket.description}", 'user_id': ticket.user_id},
-                timeout=30
-            )
-            if response.status_code == 200:
-                agent_result = response.json()
-                # Store LLM result in ticket
-                ticket.llm_intent = agent_result.get('intent')
-                ticket.llm_action_result = str(agent_result.get('action_result'))
-                db.session.commit()
-            else:
-                agent_result = {'error': f'Agent API error: {response.status_code}'}
-        except Exception as e:
-            agent_result = {'error': str(e)}
+        # Near-duplicates of resolved tickets are offered the earlier resolution
+        # on the result page; the agent only runs if the user asks for it
+        if not check_for_duplicates(ticket):
+            submit_ticket_to_agent(ticket)
 
-        # Pass agent_result to llm-result page (as query param for demo)
-        from urllib.parse import urlencode
-        params = urlencode({'agent_result': str(agent_result)})
-        return redirect(url_for('ticket_llm_result', ticket_id=ticket.id) + f'?{params}')
+        return redirect(url_for('ticket_llm_result', ticket_id=ticket.id))
     return render_template('new_ticket.html')
 
 @app.route('/ticket/<int:ticket_id>')
 @login_required
 def view_ticket(ticket_id):
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = Ticket.query.options(joinedload(Ticket.user)).filter_by(id=ticket_id).first_or_404()
     if ticket.user_id != current_user.id and current_user.role != 'admin':
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
-    # Provide related_articles to the template (e.g., 3 most recent articles)
-    related_articles = Article.query.order_by(Article.created_at.desc()).limit(3).all()
-    return render_template('view_ticket.html', ticket=ticket, related_articles=related_articles)
+    # One page of the thread with authors joined in; long threads page by cursor
+    comments = keyset_paginate(Comment.query.filter_by(ticket_id=ticket.id).options(joinedload(Comment.user)), Comment,
+                               after=request.args.get('comments_after'), before=request.args.get('comments_before'),
+                               per_page=request.args.get('comments_per_page', type=int), default_per_page=COMMENTS_PER_PAGE)
+    comment_count = db.session.query(func.count(Comment.id)).filter(Comment.ticket_id == ticket.id).scalar()
+    return render_template('view_ticket.html', ticket=ticket,
+                           comments=comments,
+                           thread=list(reversed(comments.items)),
+                           comment_count=comment_count,
+                           related_articles=suggested_articles(ticket))
 
 @app.route('/ticket/<int:ticket_id>/update-status', methods=['POST'], endpoint='update_ticket_status')
 @login_required
@@ -296,28 +860,38 @@ def update_ticket_status(ticket_id):
 @app.route('/ticket/<int:ticket_id>/comment', methods=['POST'])
 @login_required
 def add_comment(ticket_id):
-    ticket = Ticket.query.get_or_404(ticket_id)
-    if ticket.user_id != current_user.id and current_user.role != 'admin':
+    # Only the owner column is needed for the access check; the thread is never loaded
+    owner_id = db.session.query(Ticket.user_id).filter(Ticket.id == ticket_id).scalar()
+    if owner_id is None:
+        abort(404)
+    if owner_id != current_user.id and current_user.role != 'admin':
         return jsonify({'error': 'Access denied'}), 403
 
     comment = Comment(
         content=request.form['content'],
         user_id=current_user.id,
-        ticket_id=ticket_id
+        ticket_id=ticket_id,
+        created_at=datetime.utcnow()
     )
-    db.session.add(comment)
-    db.session.commit()
-
-    return jsonify({
+    # Build the response before commit expires the instances, so nothing is re-read
+    payload = {
         'content': comment.content,
         'created_at': comment.created_at.strftime('%Y-%m-%d %H:%M:%S'),
         'username': current_user.username
-    })
+    }
+    db.session.add(comment)
+    db.session.flush()
+    payload['id'] = comment.id
+    db.session.commit()
+
+    return jsonify(payload)
 
 @app.route('/my-tickets')
 @login_required
 def my_tickets():
-    tickets = Ticket.query.filter_by(user_id=current_user.id).order_by(Ticket.created_at.desc()).all()
+    tickets = keyset_paginate(Ticket.query.filter_by(user_id=current_user.id), Ticket,
+                              after=request.args.get('after'), before=request.args.get('before'),
+                              per_page=request.args.get('per_page', type=int))
     return render_template('my_tickets.html', tickets=tickets)
 
 @app.route('/knowledge-base')
@@ -325,21 +899,42 @@ def my_tickets():
 def knowledge_base():
     page = request.args.get('page', 1, type=int)
     category = request.args.get('category')
-    search = request.args.get('search', '')
-    
-    query = Article.query
+    search = request.args.get('search', '').strip()
+    per_page = 10
     
+    category_id = None
     if category:
-        query = query.filter_by(category_id=category)
-    if search:
-        query = query.filter(Article.title.ilike(f'%{search}%') | Article.content.ilike(f'%{search}%'))
+        selected = Category.query.filter_by(slug=category).first()
+        category_id = selected.id if selected else -1
     
-    pagination = query.order_by(Article.updated_at.desc()).paginate(page=page, per_page=10)
+    hits = {}
+    query_vector = semantic_query_vector(search) if search else None
+    if query_vector is not None:
+        ranked, hits = hybrid_article_search(search, query_vector, category_id)
+        page_ids = ranked[(max(page, 1) - 1) * per_page:max(page, 1) * per_page]
+        by_id = {a.id: a for a in Article.query.filter(Article.id.in_(page_ids)).all()} if page_ids else {}
+        articles = [by_id[article_id] for article_id in page_ids if article_id in by_id]
+        pagination = Pagination(None, page, per_page, len(ranked), articles)
+    elif search and fts_enabled():
+        total, results = search_articles(db.session, search, category_id=category_id,
+                                         limit=per_page, offset=(max(page, 1) - 1) * per_page)
+        hits = {hit['id']: hit for hit in results}
+        by_id = {a.id: a for a in Article.query.filter(Article.id.in_(hits)).all()} if hits else {}
+        articles = [by_id[article_id] for article_id in hits if article_id in by_id]
+        pagination = Pagination(None, page, per_page, total, articles)
+    else:
+        query = Article.query
+        if category_id is not None:
+            query = query.filter_by(category_id=category_id)
+        if search:
+            query = query.filter(Article.title.ilike(f'%{search}%') | Article.content.ilike(f'%{search}%'))
+        pagination = query.order_by(Article.updated_at.desc()).paginate(page=page, per_page=per_page)
     categories = Category.query.all()
     
     return render_template('knowledge_base.html',
                          articles=pagination.items,
                          pagination=pagination,
+                         hits=hits,
                          categories=categories,
                          category=category)
 
@@ -347,17 +942,13 @@ def knowledge_base():
 @login_required
 def view_article(article_id):
     article = Article.query.get_or_404(article_id)
-    article.views += 1
-    db.session.commit()
-    
-    related_articles = Article.query.filter_by(category_id=article.category_id)\
-        .filter(Article.id != article_id)\
-        .order_by(Article.views.desc())\
-        .limit(3).all()
+    article_counters.incr(article.id, 'views')
     
     return render_template('view_article.html',
                          article=article,
-                         related_articles=related_articles)
+                         views=(article.views or 0) + article_counters.pending(article.id, 'views'),
+                         helpful_count=(article.helpful_count or 0) + article_counters.pending(article.id, 'helpful_count'),
+                         related_articles=related_articles_for(article))
 
 @app.route('/knowledge-base/article/<int:article_id>/feedback', methods=['POST'])
 @login_required
@@ -366,8 +957,7 @@ def article_feedback(article_id):
     feedback = request.form.get('feedback')
     
     if feedback == 'helpful':
-        article.helpful_count += 1
-        db.session.commit()
+        article_counters.incr(article.id, 'helpful_count')
         flash('Thank you for your feedback!', 'success')
     else:
         flash('Thank you for your feedback. We\'ll work to improve this article.', 'info')
@@ -405,40 +995,65 @@ def profile():
             return redirect(url_for('profile'))
     
     # Get user statistics
-    total_tickets = Ticket.query.filter_by(user_id=current_user.id).count()
-    resolved_tickets = Ticket.query.filter_by(user_id=current_user.id, status='resolved').count()
-    open_tickets = Ticket.query.filter_by(user_id=current_user.id, status='open').count()
+    stats = ticket_stats(current_user.id)
     
     return render_template('profile.html',
-                         total_tickets=total_tickets,
-                         resolved_tickets=resolved_tickets,
-                         open_tickets=open_tickets)
+                         total_tickets=stats['total'],
+                         resolved_tickets=stats['resolved'],
+                         open_tickets=stats['open'])
 
 @app.route('/ai-support', methods=['GET', 'POST'])
 @login_required
 def ai_support():
     result = None
+    job_id = None
     if request.method == 'POST':
         user_input = request.form['message']
         user_id = current_user.id
         try:
-            response = requests.post(
-                'http://127.0.0.1:8000/support/resolve',
-                json={'user_input': user_input, 'user_id': user_id},
-                timeout=30
-            )
-            if response.status_code == 200:
-                result = response.json()
+            response = get_agent_client().submit_job(user_input, user_id)
+            if response.status_code == 202:
+                job_id = response.json()['job_id']
             else:
                 result = {'error': f'API error: {response.status_code}'}
         except Exception as e:
             result = {'error': str(e)}
-    return render_template('ai_support.html', result=result)
+    return render_template('ai_support.html', result=result, job_id=job_id)
+
+@app.route('/ai-support/jobs/<job_id>')
+@login_required
+def ai_support_job(job_id):
+    """Polled by the AI support page until the agent job finishes."""
+    try:
+        response = get_agent_client().get_job(job_id)
+    except requests.exceptions.RequestException:
+        return jsonify({'status': 'unavailable'}), 503
+    if response.status_code != 200:
+        return jsonify({'status': 'unknown'}), response.status_code
+    job = response.json()
+    if str(job.get('user_id')) != str(current_user.id):
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({'status': job['status'], 'result': job.get('result'), 'error': job.get('error')})
+
+@app.route('/admin/mail-outbox')
+@login_required
+def mail_outbox_status():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'error')
+        return redirect(url_for('dashboard'))
+    outbox = get_mail_outbox()
+    status = request.args.get('status')
+    return render_template('mail_outbox.html',
+                           counts=outbox.status_counts(),
+                           messages=outbox.recent(limit=100, status=status),
+                           status=status,
+                           now=datetime.now().timestamp())
 
 if __name__ == '__main__':
     with app.app_context():
         # Drop all tables and recreate them
         db.drop_all()
+        db.session.execute(text('DROP TABLE IF EXISTS article_fts'))
         db.create_all()
         
         # Create a default admin user if none exists
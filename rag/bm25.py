@@ -0,0 +1,77 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokenizer, so "15 days" keeps its digits."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Minimal in-process Okapi BM25 index over a fixed list of chunks.
+
+    The index only stores per-chunk term frequencies and document frequencies,
+    so it is cheap to rebuild or serialize alongside the FAISS index.
+    """
+
+    def __init__(self, term_freqs: List[Dict[str, int]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = term_freqs
+        self.doc_lens = [sum(tf.values()) for tf in term_freqs]
+        self.avgdl = (sum(self.doc_lens) / len(self.doc_lens)) if self.doc_lens else 0.0
+        df = Counter()
+        for tf in term_freqs:
+            df.update(tf.keys())
+        n = len(term_freqs)
+        self.idf = {
+            term: math.log(1 + (n - freq + 0.5) / (freq + 0.5))
+            for term, freq in df.items()
+        }
+
+    @classmethod
+    def from_texts(cls, texts: List[str], **kwargs) -> "BM25Index":
+        return cls([dict(Counter(tokenize(t))) for t in texts], **kwargs)
+
+    def search(self, query: str, k: int = 2) -> List[Tuple[int, float]]:
+        """Return up to k (chunk_index, score) pairs, best first. Zero scores are dropped."""
+        terms = [t for t in tokenize(query) if t in self.idf]
+        if not terms:
+            return []
+        scores = []
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[i] / (self.avgdl or 1.0))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            if score > 0:
+                scores.append((i, score))
+        scores.sort(key=lambda pair: pair[1], reverse=True)
+        return scores[:k]
+
+    def to_dict(self) -> Dict:
+        return {"k1": self.k1, "b": self.b, "term_freqs": self.term_freqs}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        return cls(data["term_freqs"], k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fuse several ranked lists of chunk indices with reciprocal rank fusion.
+
+    Each list contributes 1 / (k + rank) per item; items are returned best first.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking, start=1):
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -1,29 +1,192 @@
 import os
+import gc
+import json
+import logging
+import pickle
+import threading
+import faiss
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_core.documents import Document
 
+from rag.bm25 import BM25Index, reciprocal_rank_fusion
+from rag.embeddings import get_embeddings
+
+# File holding the chunk texts and BM25 statistics next to FAISS's index.faiss/index.pkl
+LEXICAL_INDEX_FILE = "lexical.json"
+RETRIEVAL_MODES = ("hybrid", "dense", "lexical")
+
+logger = logging.getLogger(__name__)
+
+
 class PolicyRetriever:
-    def __init__(self, policy_dir="policies"):
+    """
+    Retriever over the markdown policy corpus.
+
+    Modes:
+        hybrid:  BM25 and FAISS rankings fused with reciprocal rank fusion (default)
+        dense:   FAISS similarity only
+        lexical: BM25 only, never touches the embedding model
+
+    Until the dense index is warm (``warm=False`` or before ``warm()`` is called),
+    hybrid and dense queries short-circuit to the lexical index.
+
+    With ``mmap=True`` a persisted FAISS index is opened read-only from index_dir
+    through mmap, so forked workers share its pages instead of copying them.
+    """
+
+    def __init__(self, policy_dir="policies", mode="hybrid", index_dir=None, warm=True,
+                 chunk_size=500, chunk_overlap=50, embedding_backend=None, mmap=False):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
         self.policy_dir = policy_dir
+        self.mode = mode
+        self.index_dir = index_dir
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedding_backend = embedding_backend
+        self.mmap = mmap
         self.index = None
+        self.bm25 = None
         self.docs = []
-        self._load_and_index()
+        self.chunks = []
+        if index_dir and os.path.exists(os.path.join(index_dir, LEXICAL_INDEX_FILE)):
+            self._load_persisted(index_dir)
+        else:
+            self._load_and_index()
+        if warm and mode != "lexical":
+            self.warm()
+            if index_dir and not os.path.exists(os.path.join(index_dir, "index.faiss")):
+                self.save(index_dir)
+
+    @property
+    def is_warm(self):
+        return self.index is not None
 
     def _load_and_index(self):
         # Load all .md files
-        for fname in os.listdir(self.policy_dir):
+        for fname in sorted(os.listdir(self.policy_dir)):
             if fname.endswith(".md"):
                 with open(os.path.join(self.policy_dir, fname), "r") as f:
                     content = f.read()
                     self.docs.append(Document(page_content=content, metadata={"source": fname}))
-        # Split docs
-        splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        split_docs = splitter.split_documents(self.docs)
-        # Embeddings
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        self.index = FAISS.from_documents(split_docs, embeddings)
-
-    def retrieve(self, query, k=2):
-        return self.index.similarity_search(query, k=k)
+        # Split docs; chunk_id ties FAISS hits back to the BM25 postings
+        splitter = CharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+        self.chunks = splitter.split_documents(self.docs)
+        for i, chunk in enumerate(self.chunks):
+            chunk.metadata["chunk_id"] = i
+        self.bm25 = BM25Index.from_texts([c.page_content for c in self.chunks])
+
+    def _load_persisted(self, index_dir):
+        with open(os.path.join(index_dir, LEXICAL_INDEX_FILE), "r") as f:
+            data = json.load(f)
+        self.chunks = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in data["chunks"]]
+        self.bm25 = BM25Index.from_dict(data["bm25"])
+
+    def _embeddings(self):
+        return get_embeddings(self.embedding_backend)
+
+    def warm(self):
+        """Load the embedding model and the FAISS index (from index_dir when persisted)."""
+        if self.index is not None:
+            return
+        embeddings = self._embeddings()
+        if self.index_dir and os.path.exists(os.path.join(self.index_dir, "index.faiss")):
+            if self.mmap:
+                self.index = self._load_mmap(self.index_dir, embeddings)
+            else:
+                # The pickle was written by save() below, not taken from user input
+                self.index = FAISS.load_local(self.index_dir, embeddings, allow_dangerous_deserialization=True)
+        else:
+            self.index = FAISS.from_documents(self.chunks, embeddings)
+
+    @staticmethod
+    def _load_mmap(index_dir, embeddings):
+        # Same layout as FAISS.save_local, but the vectors stay in the page cache
+        index = faiss.read_index(os.path.join(index_dir, "index.faiss"),
+                                 faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    def save(self, index_dir):
+        """Persist the lexical index and, when built, the FAISS index into one directory."""
+        os.makedirs(index_dir, exist_ok=True)
+        if self.index is not None:
+            self.index.save_local(index_dir)
+        data = {
+            "chunks": [{"page_content": c.page_content, "metadata": c.metadata} for c in self.chunks],
+            "bm25": self.bm25.to_dict(),
+        }
+        with open(os.path.join(index_dir, LEXICAL_INDEX_FILE), "w") as f:
+            json.dump(data, f)
+
+    def _dense_ranking(self, query, fetch_k):
+        hits = self.index.similarity_search(query, k=fetch_k)
+        return [doc.metadata["chunk_id"] for doc in hits]
+
+    def _lexical_ranking(self, query, fetch_k):
+        return [idx for idx, _ in self.bm25.search(query, k=fetch_k)]
+
+    def retrieve(self, query, k=2, mode=None):
+        mode = mode or self.mode
+        if mode != "lexical" and self.index is None:
+            mode = "lexical"
+        if mode == "lexical":
+            ranking = self._lexical_ranking(query, k)
+        elif mode == "dense":
+            ranking = self._dense_ranking(query, k)
+        else:
+            fetch_k = min(len(self.chunks), max(4 * k, 10))
+            fused = reciprocal_rank_fusion([
+                self._dense_ranking(query, fetch_k),
+                self._lexical_ranking(query, fetch_k),
+            ])
+            ranking = [idx for idx, _ in fused[:k]]
+        return [self.chunks[idx] for idx in ranking]
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_policy_retriever():
+    """
+    Process-wide PolicyRetriever, configured from the environment:
+        POLICY_DIR, POLICY_INDEX_DIR, POLICY_RETRIEVAL_MODE, POLICY_INDEX_MMAP=1
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = PolicyRetriever(
+                    policy_dir=os.getenv("POLICY_DIR", "policies"),
+                    mode=os.getenv("POLICY_RETRIEVAL_MODE", "hybrid"),
+                    index_dir=os.getenv("POLICY_INDEX_DIR") or None,
+                    mmap=os.getenv("POLICY_INDEX_MMAP") == "1",
+                )
+    return _retriever
+
+
+def preload_policy_retriever():
+    """
+    Load the process-wide retriever in a pre-fork master (e.g. gunicorn --preload).
+
+    Model weights and index pages are then shared copy-on-write by every worker.
+    gc.freeze() moves the loaded objects out of the collector's generations so
+    later collections in the workers do not write to (and un-share) those pages.
+
+    Only a persisted index is loaded: without POLICY_INDEX_DIR pointing at a
+    directory written by save(), building would embed the whole corpus in the
+    master, so preloading is skipped and returns None; workers then build
+    lazily on first use.
+    """
+    mode = os.getenv("POLICY_RETRIEVAL_MODE", "hybrid")
+    index_dir = os.getenv("POLICY_INDEX_DIR") or None
+    needed = LEXICAL_INDEX_FILE if mode == "lexical" else "index.faiss"
+    if not index_dir or not os.path.exists(os.path.join(index_dir, needed)):
+        logger.warning("No persisted policy index in POLICY_INDEX_DIR=%r; skipping preload", index_dir)
+        return None
+    retriever = get_policy_retriever()
+    gc.freeze()
+    return retriever
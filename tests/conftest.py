@@ -0,0 +1,77 @@
+# tests/conftest.py
+import importlib.util
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Fail the test if the block runs more than ``limit`` SQL statements:
+
+        with max_queries(6):
+            client.get("/my-tickets")
+    """
+    from utils.query_stats import count_queries
+
+    @contextmanager
+    def check(limit):
+        with count_queries() as stats:
+            yield stats
+        detail = "\n".join(f"  {n}x {' '.join(statement.split())[:160]}"
+                           for statement, n in stats.statements.most_common(5))
+        assert stats.count <= limit, f"{stats.count} queries, limit {limit}:\n{detail}"
+
+    return check
+
+
+@pytest.fixture(scope="session")
+def portal(tmp_path_factory):
+    """The IT support portal app on a seeded temporary database."""
+    pytest.importorskip("flask_sqlalchemy")
+    os.environ.setdefault("SEMANTIC_SEARCH", "0")
+    spec = importlib.util.spec_from_file_location("support_portal_app", os.path.join(ROOT, "it-support-portal", "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    # Flask resolves templates relative to the module registered under its import name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    app, db = module.app, module.db
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path_factory.mktemp('portal') / 'portal.db'}",
+        TESTING=True,
+    )
+    with app.app_context():
+        db.create_all()
+        alice = module.User(username="alice", email="alice@example.com")
+        alice.set_password("pw")
+        db.session.add(alice)
+        db.session.flush()
+        category = module.Category(name="Network", slug="network")
+        db.session.add(category)
+        db.session.flush()
+        db.session.add_all(module.Article(title=f"Article {i}", content="VPN troubleshooting steps", summary="VPN",
+                                          author_id=alice.id, category_id=category.id) for i in range(20))
+        db.session.add_all(module.Ticket(title=f"Ticket {i}", description="VPN keeps dropping",
+                                         user_id=alice.id, status="open" if i % 2 else "resolved",
+                                         llm_action_result="done") for i in range(60))
+        bob = module.User(username="bob", email="bob@example.com")
+        bob.set_password("pw")
+        db.session.add(bob)
+        db.session.flush()
+        # Ticket 2 carries a long thread from two authors; ticket 1 has none
+        db.session.add_all(module.Comment(content=f"Comment {i}", ticket_id=2,
+                                          user_id=alice.id if i % 2 else bob.id) for i in range(120))
+        db.session.commit()
+    return module
+
+
+@pytest.fixture
+def portal_client(portal):
+    client = portal.app.test_client()
+    client.post("/login", data={"username": "alice", "password": "pw"})
+    return client
@@ -0,0 +1,76 @@
+# tests/test_admission.py
+import asyncio
+import pytest
+from api.admission import AdmissionController, AdmissionRejected, TokenBucket, UserRateLimiter
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(capacity=2, rate=1.0, now=0.0)
+    assert bucket.try_acquire(now=0.0)[0]
+    assert bucket.try_acquire(now=0.0)[0]
+    allowed, retry_after = bucket.try_acquire(now=0.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+    assert bucket.try_acquire(now=1.0)[0]
+
+def test_rate_limiter_is_per_user():
+    limiter = UserRateLimiter(per_minute=60, burst=1)
+    assert limiter.check("1", now=0.0)[0]
+    assert not limiter.check("1", now=0.0)[0]
+    assert limiter.check("2", now=0.0)[0]
+
+def test_rate_limited_user_rejected():
+    controller = AdmissionController(user_rate_per_minute=60, user_burst=1)
+
+    async def run():
+        async with controller.slot("1"):
+            pass
+        with pytest.raises(AdmissionRejected) as exc:
+            async with controller.slot("1"):
+                pass
+        assert exc.value.reason == "rate_limited"
+        assert exc.value.retry_after > 0
+
+    asyncio.run(run())
+
+def test_queue_full_and_timeout():
+    """With every slot busy, waiters time out and overflow is rejected at once."""
+    controller = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=0.05,
+                                     user_rate_per_minute=6000, user_burst=100)
+
+    async def hold(release):
+        async with controller.slot("a"):
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(release))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(controller.slot("b").__aenter__())
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as exc:
+            async with controller.slot("c"):
+                pass
+        assert exc.value.reason == "queue_full"
+        with pytest.raises(AdmissionRejected) as exc:
+            await waiter
+        assert exc.value.reason == "queue_timeout"
+        release.set()
+        await holder
+
+    asyncio.run(run())
+
+def test_batch_slots_skip_rate_limit_but_share_capacity():
+    controller = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=0.05,
+                                     user_rate_per_minute=60, user_burst=1)
+
+    async def run():
+        for _ in range(3):
+            async with controller.slot("1", interactive=False):
+                pass
+        async with controller.slot("2", interactive=False):
+            # The batch item holds the only slot, so interactive traffic is turned away
+            with pytest.raises(AdmissionRejected) as exc:
+                async with controller.slot("3"):
+                    pass
+            assert exc.value.reason == "queue_full"
+
+    asyncio.run(run())
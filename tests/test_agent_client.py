@@ -0,0 +1,60 @@
+# tests/test_agent_client.py
+import pytest
+from unittest.mock import MagicMock, patch
+
+requests = pytest.importorskip("requests")
+from utils.agent_client import AgentClient, CircuitBreaker, CircuitOpenError
+
+def response(status):
+    r = MagicMock()
+    r.status_code = status
+    return r
+
+@pytest.fixture
+def client():
+    c = AgentClient(base_url="http://agent:8000/", retries=2, breaker=CircuitBreaker(3, 30))
+    c.session = MagicMock()
+    with patch.object(AgentClient, "_sleep"):
+        yield c
+
+def test_uses_base_url_and_split_timeouts(client):
+    client.session.request.return_value = response(200)
+    client.get_job("job_1")
+    args, kwargs = client.session.request.call_args
+    assert args == ("GET", "http://agent:8000/support/jobs/job_1")
+    assert kwargs["timeout"][0] == client.timeout[0]
+
+def test_idempotent_calls_are_retried(client):
+    client.session.request.side_effect = [requests.exceptions.ReadTimeout(), response(503), response(200)]
+    assert client.get_job("job_1").status_code == 200
+    assert client.session.request.call_count == 3
+
+def test_post_not_retried_after_it_may_have_been_sent(client):
+    client.session.request.side_effect = requests.exceptions.ReadTimeout()
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.resolve("refund order 1", 1)
+    assert client.session.request.call_count == 1
+
+def test_post_retried_on_connect_timeout(client):
+    client.session.request.side_effect = [requests.exceptions.ConnectTimeout(), response(200)]
+    assert client.resolve("refund order 1", 1).status_code == 200
+
+def test_breaker_opens_and_fails_fast(client):
+    client.session.request.side_effect = requests.exceptions.ConnectionError()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get_job("job_1")
+    client.session.request.reset_mock()
+    with pytest.raises(CircuitOpenError):
+        client.get_job("job_1")
+    client.session.request.assert_not_called()
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    with patch("utils.agent_client.time.monotonic", return_value=0.0):
+        breaker.record_failure()
+        assert not breaker.allow()
+    with patch("utils.agent_client.time.monotonic", return_value=11.0):
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
@@ -0,0 +1,56 @@
+# tests/test_api.py
+import json
+import pytest
+from unittest.mock import patch
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+import api.main as main
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+def fake_agent_act(user_input, user_id=None, chat_history=None):
+    return {"response": f"handled: {user_input}", "success": True}
+
+def test_batch_streams_ndjson_and_deduplicates(client, monkeypatch):
+    """Every input gets a line; identical requests run the agent once."""
+    body = {"requests": [
+        {"user_input": "Where is order 1?", "user_id": 1},
+        {"user_input": "where is  order 1?", "user_id": 1},
+        {"user_input": "Cancel order 2", "user_id": 2},
+    ]}
+    monkeypatch.setattr(main, "BATCH_API_TOKEN", "ops-secret")
+    assert client.post("/support/resolve/batch", json=body).status_code == 403
+    with patch('api.main.agent_act', side_effect=fake_agent_act) as mock_act:
+        response = client.post("/support/resolve/batch", json=body,
+                               headers={"Authorization": "Bearer ops-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    assert [line["duplicate_of"] for line in lines if "duplicate_of" in line] == [0]
+    assert mock_act.call_count == 2
+
+def test_agent_gets_only_its_own_conversation_history(client):
+    with patch('api.main.agent_act', side_effect=fake_agent_act) as mock_act:
+        first = client.post("/support/resolve", json={"user_input": "refund order 1", "user_id": 1}).json()
+        client.post("/support/resolve", json={"user_input": "cancel order 2", "user_id": 2})
+        client.post("/support/resolve", json={"user_input": "yes", "user_id": 1,
+                                              "conversation_id": first["conversation_id"]})
+    history = mock_act.call_args_list[-1].kwargs["chat_history"]
+    assert [m["content"] for m in history] == ["refund order 1", "handled: refund order 1"]
+
+def test_coalescing_window_reuses_only_the_same_turn(client, monkeypatch):
+    """With a window enabled, the same answer on a later turn of the conversation still reaches the agent."""
+    monkeypatch.setattr(main, "resolve_flight", main.SingleFlight(window=60))
+    with patch('api.main.agent_act', side_effect=fake_agent_act) as mock_act:
+        first = client.post("/support/resolve", json={"user_input": "hello", "user_id": 7}).json()
+        body = {"user_input": "yes", "user_id": 7, "conversation_id": first["conversation_id"]}
+        assert client.post("/support/resolve", json=body).status_code == 200
+        assert mock_act.call_count == 2
+        # Each "yes" is a new turn (the conversation grew), so the agent runs again
+        assert client.post("/support/resolve", json=body).status_code == 200
+        assert mock_act.call_count == 3
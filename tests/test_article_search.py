@@ -0,0 +1,46 @@
+# tests/test_article_search.py
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("markupsafe")
+from sqlalchemy import create_engine, text
+
+from utils.article_search import ensure_article_fts, fts_query, search_articles
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE article (id INTEGER PRIMARY KEY, title TEXT, summary TEXT, "
+                          "content TEXT, category_id INTEGER, views INTEGER DEFAULT 0)"))
+        conn.execute(text("INSERT INTO article (id, title, summary, content, category_id) VALUES "
+                          "(1, 'VPN keeps disconnecting', NULL, 'Reset the network adapter.', 1), "
+                          "(2, 'Email setup', 'Outlook', 'Connect to the VPN before <script>sync</script>.', 2)"))
+        # Existing rows are indexed when the index is first created
+        ensure_article_fts(conn)
+        yield conn
+
+def test_title_matches_rank_first_and_category_filters(conn):
+    total, hits = search_articles(conn, "vpn")
+    assert total == 2 and [h["id"] for h in hits] == [1, 2]
+    assert "<mark>VPN</mark>" in hits[0]["title"]
+    total, hits = search_articles(conn, "vpn", category_id=2)
+    assert [h["id"] for h in hits] == [2]
+
+def test_snippet_is_escaped(conn):
+    _, hits = search_articles(conn, "sync")
+    assert "&lt;script&gt;" in hits[0]["snippet"] and "<mark>sync</mark>" in hits[0]["snippet"]
+
+def test_triggers_follow_insert_update_delete(conn):
+    conn.execute(text("INSERT INTO article (id, title, content, category_id) VALUES (3, 'Printer jam', 'Open tray', 1)"))
+    assert search_articles(conn, "printer")[0] == 1
+    conn.execute(text("UPDATE article SET title = 'Scanner jam' WHERE id = 3"))
+    assert search_articles(conn, "printer")[0] == 0
+    assert search_articles(conn, "scann")[0] == 1
+    conn.execute(text("UPDATE article SET views = views + 1 WHERE id = 3"))
+    conn.execute(text("DELETE FROM article WHERE id = 3"))
+    assert search_articles(conn, "scanner")[0] == 0
+
+def test_fts_query_neutralises_syntax():
+    assert fts_query('vpn OR "drop" (net') == '"vpn" "or" "drop" "net"*'
+    assert fts_query("  ?!  ") is None
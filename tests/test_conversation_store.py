@@ -0,0 +1,69 @@
+# tests/test_conversation_store.py
+import pytest
+from unittest.mock import patch
+from api.conversation_store import ConversationStore, InMemoryConversationStore, SQLiteConversationStore
+
+def msg(content, role="user"):
+    return {"role": role, "content": content, "timestamp": None, "metadata": {}}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryConversationStore()
+    return SQLiteConversationStore(str(tmp_path / "conversations.db"))
+
+def test_append_and_get(store):
+    """Turns are appended in order and unknown conversations return None."""
+    assert store.get("conv_1") is None
+    assert not store.exists("conv_1")
+    store.append("conv_1", [msg("hi"), msg("hello", "assistant")])
+    store.append("conv_1", [msg("refund please")])
+    assert [m["content"] for m in store.get("conv_1")] == ["hi", "hello", "refund please"]
+    assert store.exists("conv_1")
+
+def test_delete(store):
+    store.append("conv_1", [msg("hi")])
+    store.delete("conv_1")
+    assert store.get("conv_1") is None
+
+def test_sqlite_shared_between_instances(tmp_path):
+    """Two workers opening the same file see each other's turns."""
+    path = str(tmp_path / "conversations.db")
+    SQLiteConversationStore(path).append("conv_1", [msg("hi")])
+    assert SQLiteConversationStore(path).get("conv_1") == [msg("hi")]
+
+def test_memory_lru_eviction():
+    store = InMemoryConversationStore(max_conversations=2)
+    store.append("a", [msg("1")])
+    store.append("b", [msg("2")])
+    store.get("a")
+    store.append("c", [msg("3")])
+    assert store.get("b") is None
+    assert store.get("a") and store.get("c")
+
+def test_memory_byte_cap():
+    store = InMemoryConversationStore(max_bytes=300)
+    for i in range(10):
+        store.append(f"conv_{i}", [msg("x" * 50)])
+    assert len(store) < 10
+    assert store.get("conv_9") is not None
+
+def test_memory_ttl():
+    store = InMemoryConversationStore(ttl_seconds=60)
+    with patch("api.conversation_store.time.monotonic", return_value=1000.0):
+        store.append("conv_1", [msg("hi")])
+    with patch("api.conversation_store.time.monotonic", return_value=1061.0):
+        assert store.get("conv_1") is None
+
+def test_turn_count(store):
+    assert store.turn_count("conv_1") == 0
+    store.append("conv_1", [msg("yes"), msg("done", "assistant")])
+    store.append("conv_1", [msg("yes")])
+    assert store.turn_count("conv_1") == 3
+
+def test_incomplete_store_fails_at_construction():
+    class GetOnly(ConversationStore):
+        def get(self, conversation_id):
+            return None
+    with pytest.raises(TypeError):
+        GetOnly()
@@ -0,0 +1,39 @@
+# tests/test_counter_buffer.py
+import threading
+import time
+from utils.counter_buffer import CounterBuffer
+
+def test_increments_are_aggregated_into_one_flush():
+    batches = []
+    buffer = CounterBuffer(batches.append, interval=60, threshold=1000)
+    for _ in range(5):
+        buffer.incr(1, "views")
+    buffer.incr(2, "views")
+    buffer.incr(1, "helpful_count")
+    assert buffer.pending(1, "views") == 5
+    assert buffer.flush() == 2
+    assert batches == [{1: {"views": 5, "helpful_count": 1}, 2: {"views": 1}}]
+    assert buffer.pending(1, "views") == 0
+    assert buffer.flush() == 0
+
+def test_threshold_wakes_background_flush():
+    flushed = threading.Event()
+    buffer = CounterBuffer(lambda batch: flushed.set(), interval=60, threshold=3)
+    for _ in range(3):
+        buffer.incr(7, "views")
+    assert flushed.wait(2)
+
+def test_failed_flush_keeps_deltas():
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    buffer = CounterBuffer(flaky, interval=60, threshold=1000)
+    buffer.incr(1, "views", 2)
+    assert buffer.flush() == 0
+    buffer.incr(1, "views")
+    assert buffer.flush() == 1
+    assert calls[-1] == {1: {"views": 3}}
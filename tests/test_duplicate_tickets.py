@@ -0,0 +1,123 @@
+# tests/test_duplicate_tickets.py
+import pytest
+
+class FakeResponse:
+    def __init__(self, job_id, status_code=202):
+        self.job_id = job_id
+        self.status_code = status_code
+
+    def json(self):
+        return {"job_id": self.job_id}
+
+class FakeAgentClient:
+    def __init__(self):
+        self.submitted = []
+
+    def submit_job(self, user_input, user_id, **kwargs):
+        self.submitted.append(user_input)
+        return FakeResponse(f"job_{len(self.submitted)}")
+
+@pytest.fixture
+def agent(portal, monkeypatch):
+    client = FakeAgentClient()
+    monkeypatch.setattr(portal, "get_agent_client", lambda: client)
+    return client
+
+@pytest.fixture
+def matched_ticket(portal):
+    """A new ticket with one stored match against a resolved ticket."""
+    db = portal.db
+    with portal.app.app_context():
+        alice = portal.User.query.filter_by(username="alice").one()
+        source = portal.Ticket(title="VPN down", description="VPN drops", user_id=alice.id,
+                               status="resolved", llm_intent="network", llm_action_result="Reset the VPN profile")
+        ticket = portal.Ticket(title="VPN down again", description="VPN drops", user_id=alice.id)
+        db.session.add_all([source, ticket])
+        db.session.flush()
+        db.session.add(portal.TicketDuplicateMatch(ticket_id=ticket.id, rank=1, source_ticket_id=source.id, score=0.95))
+        db.session.commit()
+        return ticket.id, source.id
+
+def load(portal, ticket_id):
+    with portal.app.app_context():
+        return portal.db.session.get(portal.Ticket, ticket_id)
+
+def test_result_page_get_has_no_side_effects(portal, portal_client, agent, matched_ticket):
+    ticket_id, source_id = matched_ticket
+    page = portal_client.get(f"/ticket/{ticket_id}/llm-result").get_data(as_text=True)
+    assert "Reset the VPN profile" in page
+    with portal.app.app_context():
+        portal.db.session.get(portal.Ticket, source_id).status = "open"
+        portal.db.session.commit()
+    # The match is gone, but loading the page must still not queue the agent
+    portal_client.get(f"/ticket/{ticket_id}/llm-result")
+    assert agent.submitted == []
+    assert load(portal, ticket_id).agent_job_id is None
+
+def test_reuse_copies_resolution(portal, portal_client, agent, matched_ticket):
+    ticket_id, source_id = matched_ticket
+    portal_client.post(f"/ticket/{ticket_id}/llm-result", data={"choice": "reuse", "source_ticket_id": source_id})
+    ticket = load(portal, ticket_id)
+    assert ticket.duplicate_of_id == source_id
+    assert ticket.llm_action_result == "Reset the VPN profile"
+    assert agent.submitted == []
+
+def test_vanished_match_falls_back_to_agent_once(portal, portal_client, agent, matched_ticket):
+    ticket_id, source_id = matched_ticket
+    with portal.app.app_context():
+        portal.db.session.get(portal.Ticket, source_id).status = "open"
+        portal.db.session.commit()
+    portal_client.post(f"/ticket/{ticket_id}/llm-result", data={"choice": "reuse", "source_ticket_id": source_id})
+    portal_client.post(f"/ticket/{ticket_id}/llm-result", data={"choice": "run_agent"})
+    assert len(agent.submitted) == 1
+    assert load(portal, ticket_id).agent_job_id == "job_1"
+
+def test_submit_claims_ticket_before_queueing(portal, agent, matched_ticket):
+    ticket_id, _ = matched_ticket
+    with portal.app.test_request_context():
+        ticket = portal.db.session.get(portal.Ticket, ticket_id)
+        assert portal.submit_ticket_to_agent(ticket)
+        assert not portal.submit_ticket_to_agent(ticket)
+    assert len(agent.submitted) == 1
+
+class ValidatingAgentClient(FakeAgentClient):
+    """Checks callback_url the way POST /support/jobs does."""
+    def __init__(self, hosts):
+        super().__init__()
+        self.hosts = hosts
+        self.payloads = []
+
+    def submit_job(self, user_input, user_id, **kwargs):
+        from api.jobs import callback_url_allowed
+        self.payloads.append(kwargs)
+        callback_url = kwargs.get("callback_url")
+        if callback_url and not callback_url_allowed(callback_url, self.hosts):
+            return FakeResponse(None, status_code=422)
+        return super().submit_job(user_input, user_id, **kwargs)
+
+@pytest.mark.parametrize("hosts, with_callback", [(["http://localhost"], True), ([], False)])
+def test_submit_payload_passes_api_callback_check(portal, monkeypatch, matched_ticket, hosts, with_callback):
+    pytest.importorskip("httpx")
+    client = ValidatingAgentClient(hosts)
+    monkeypatch.setattr(portal, "get_agent_client", lambda: client)
+    ticket_id, _ = matched_ticket
+    with portal.app.test_request_context():
+        assert portal.submit_ticket_to_agent(portal.db.session.get(portal.Ticket, ticket_id))
+    assert client.payloads[0]["callback_url"].startswith("http://localhost/")
+    # A refused callback is dropped and the job is queued for polling instead
+    assert ("callback_url" in client.payloads[-1]) == with_callback
+    assert load(portal, ticket_id).agent_job_id == "job_1"
+
+def test_duplicate_check_does_not_wait_behind_embedding_jobs(portal, monkeypatch, matched_ticket):
+    import threading
+    monkeypatch.setattr(portal, "get_embedder", lambda: object())
+    monkeypatch.setattr(portal, "store_duplicate_matches", lambda conn, ticket_id: 1)
+    release = threading.Event()
+    busy = portal.embedding_executor.submit(release.wait, 5)
+    try:
+        ticket_id, _ = matched_ticket
+        with portal.app.app_context():
+            assert portal.check_for_duplicates(portal.db.session.get(portal.Ticket, ticket_id))
+    finally:
+        release.set()
+        busy.result()
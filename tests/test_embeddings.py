@@ -0,0 +1,40 @@
+# tests/test_embeddings.py
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+
+from rag.embeddings import OnnxEmbeddings, export_quantized_onnx, get_embeddings
+
+SENTENCES = [
+    "Customers may request a refund within 30 days of delivery.",
+    "Perishable goods can be refunded within 15 days.",
+    "How do I cancel my order before it ships?",
+    "My laptop won't boot after the update",
+]
+
+@pytest.fixture(scope="module")
+def onnx_dir(tmp_path_factory):
+    out = tmp_path_factory.mktemp("onnx")
+    export_quantized_onnx(str(out))
+    return str(out)
+
+def test_int8_onnx_parity_with_torch(onnx_dir):
+    """Quantized vectors must stay within a small cosine drift of the PyTorch ones."""
+    torch_vectors = np.array(get_embeddings("torch").embed_documents(SENTENCES))
+    onnx_vectors = np.array(OnnxEmbeddings(model_dir=onnx_dir).embed_documents(SENTENCES))
+    torch_vectors /= np.linalg.norm(torch_vectors, axis=1, keepdims=True)
+    cosines = (torch_vectors * onnx_vectors).sum(axis=1)
+    assert cosines.min() > 0.98
+
+def test_onnx_query_matches_documents(onnx_dir):
+    embeddings = OnnxEmbeddings(model_dir=onnx_dir)
+    query = np.array(embeddings.embed_query(SENTENCES[0]))
+    doc = np.array(embeddings.embed_documents(SENTENCES[:1])[0])
+    assert np.allclose(query, doc, atol=1e-5)
+    assert np.isclose(np.linalg.norm(query), 1.0, atol=1e-4)
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        get_embeddings("tpu")
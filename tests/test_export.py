@@ -0,0 +1,52 @@
+# tests/test_export.py
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+pytest.importorskip("flask_login")
+from sqlalchemy import create_engine
+
+from db.export import export_chunks, parse_date
+from db.schema import Order, RefundHistory, User, db
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    db.Model.metadata.create_all(engine)
+    start = datetime(2025, 1, 1)
+    with engine.begin() as c:
+        c.execute(User.__table__.insert(), [{"id": 1, "username": "alice", "password_hash": "x"}])
+        c.execute(Order.__table__.insert(), [
+            {"id": i, "user_id": 1, "product_id": i, "product_name": f"Widget, size {i}", "amount": 10.0 * i,
+             "status": "shipped", "order_date": start + timedelta(days=i)} for i in range(1, 31)])
+        c.execute(RefundHistory.__table__.insert(), [
+            {"id": 1, "user_id": 1, "order_id": 3, "amount": 30.0, "refund_date": start, "reason": 'said "broken"'}])
+    with engine.connect() as c:
+        yield c
+
+def test_csv_streams_in_batches_with_header_first(conn):
+    chunks = list(export_chunks(conn, "orders", "csv", batch_size=8))
+    assert len(chunks) == 1 + 4
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert [int(r["id"]) for r in rows] == list(range(1, 31))
+    assert rows[0]["product_name"] == "Widget, size 1"
+    assert rows[0]["order_date"] == "2025-01-02T00:00:00"
+
+def test_date_range_includes_whole_end_day(conn):
+    start, end = parse_date("2025-01-10"), parse_date("2025-01-12", end=True)
+    lines = "".join(export_chunks(conn, "orders", "ndjson", start, end)).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [9, 10, 11]
+
+def test_ndjson_and_empty_csv(conn):
+    (line,) = "".join(export_chunks(conn, "refunds", "ndjson")).splitlines()
+    assert json.loads(line)["reason"] == 'said "broken"'
+    assert "".join(export_chunks(conn, "tickets", "csv")).startswith("id,title,")
+
+def test_rejects_unknown_dataset_and_bad_dates(conn):
+    with pytest.raises(ValueError):
+        list(export_chunks(conn, "users", "csv"))
+    with pytest.raises(ValueError):
+        parse_date("31/01/2025")
@@ -0,0 +1,99 @@
+# tests/test_jobs.py
+import asyncio
+import pytest
+
+pytest.importorskip("httpx")
+from api.jobs import JobRunner, JobStore, callback_url_allowed, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+async def wait_for_status(store, job_id, statuses, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while store.get(job_id)["status"] not in statuses:
+        assert asyncio.get_running_loop().time() < deadline, "job did not finish"
+        await asyncio.sleep(0.01)
+    return store.get(job_id)
+
+def test_job_runs_and_result_is_stored(store):
+    async def handler(request):
+        return {"response": f"handled {request['user_input']}", "success": True}
+
+    async def run():
+        runner = JobRunner(store, handler, workers=2)
+        await runner.start()
+        job = await runner.submit({"user_input": "refund order 1", "user_id": 1})
+        assert job["status"] == JOB_QUEUED
+        done = await wait_for_status(store, job["id"], (JOB_SUCCEEDED, JOB_FAILED))
+        await runner.stop()
+        return done
+
+    done = asyncio.run(run())
+    assert done["status"] == JOB_SUCCEEDED
+    assert done["result"]["response"] == "handled refund order 1"
+    assert done["attempts"] == 1
+
+def test_handler_error_marks_job_failed(store):
+    async def handler(request):
+        raise RuntimeError("LLM unavailable")
+
+    async def run():
+        runner = JobRunner(store, handler, workers=1)
+        await runner.start()
+        job = await runner.submit({"user_input": "hi", "user_id": 1})
+        done = await wait_for_status(store, job["id"], (JOB_SUCCEEDED, JOB_FAILED))
+        await runner.stop()
+        return done
+
+    done = asyncio.run(run())
+    assert done["status"] == JOB_FAILED
+    assert "LLM unavailable" in done["error"]
+
+def test_claim_is_exclusive_and_stale_jobs_recovered(store):
+    job = store.create({"user_input": "hi", "user_id": 1})
+    assert store.claim(job["id"])
+    assert not store.claim(job["id"])
+    assert store.get(job["id"])["status"] == JOB_RUNNING
+    assert store.recover(stale_after=3600) == []
+    recovered = store.recover(stale_after=-1)
+    assert [j["id"] for j in recovered] == [job["id"]]
+
+def test_live_heartbeat_prevents_recovery(store):
+    job = store.create({"user_input": "refund order 1", "user_id": 1})
+    assert store.claim(job["id"], owner="worker-a")
+    # Started long ago but still heartbeating: another process must not requeue it
+    store._conn().execute("UPDATE agent_job SET started_at = 0 WHERE id = ?", (job["id"],))
+    assert store.heartbeat(job["id"], "worker-a")
+    assert store.recover(stale_after=60) == []
+    assert not store.heartbeat(job["id"], "worker-b")
+
+def test_heartbeat_interval_must_be_below_stale_after(store):
+    async def handler(request):
+        return {}
+    with pytest.raises(ValueError):
+        JobRunner(store, handler, stale_after=10, heartbeat_interval=10)
+
+def test_callback_allowlist():
+    hosts = ["hooks.example.com", "*.partner.io"]
+    assert callback_url_allowed("https://hooks.example.com/jobs", hosts)
+    assert callback_url_allowed("https://a.b.partner.io:8443/cb", hosts)
+    assert not callback_url_allowed("http://hooks.example.com/jobs", hosts)
+    assert not callback_url_allowed("https://169.254.169.254/latest", hosts)
+    assert not callback_url_allowed("https://hooks.example.com.evil.net/", hosts)
+    assert not callback_url_allowed("https://user@localhost/", hosts)
+    assert not callback_url_allowed("https://partner.io.evil/", hosts)
+    assert not callback_url_allowed("https://hooks.example.com/", [])
+    internal = ["http://portal.internal:5000"]
+    assert callback_url_allowed("http://portal.internal:5000/api/agent-callback/1", internal)
+    assert callback_url_allowed("https://portal.internal/cb", internal)
+    assert not callback_url_allowed("http://other.internal/cb", internal)
+
+def test_store_reopens_connection_after_fork(store, monkeypatch):
+    parent = store._conn()
+    assert store._conn() is parent
+    monkeypatch.setattr("api.jobs.os.getpid", lambda: -1)
+    child = store._conn()
+    assert child is not parent
+    job = store.create({"user_input": "hi", "user_id": "1"})
+    assert store.get(job["id"])["status"] == JOB_QUEUED
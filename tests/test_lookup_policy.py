@@ -0,0 +1,33 @@
+# tests/test_lookup_policy.py
+import pytest
+from unittest.mock import patch, MagicMock
+
+pytest.importorskip("langchain_community")
+
+from tools import lookup_policy as lookup_module
+from tools.lookup_policy import lookup_policy
+
+@pytest.fixture
+def mock_retriever():
+    chunk = MagicMock()
+    chunk.page_content = "  - Customers may request a refund within 30 days of delivery.\n"
+    retriever = MagicMock()
+    retriever.retrieve.return_value = [chunk]
+    lookup_module._cached_lookup.cache_clear()
+    with patch('tools.lookup_policy.get_policy_retriever', return_value=retriever):
+        yield retriever
+    lookup_module._cached_lookup.cache_clear()
+
+def test_lookup_returns_compact_text(mock_retriever):
+    """Only the stripped chunk text is returned to the agent."""
+    assert lookup_policy("Refund window?") == "- Customers may request a refund within 30 days of delivery."
+
+def test_lookup_is_cached_per_normalized_query(mock_retriever):
+    """Repeated questions differing only in case/whitespace hit the cache."""
+    lookup_policy("Refund window?")
+    lookup_policy("  refund   WINDOW? ")
+    mock_retriever.retrieve.assert_called_once()
+
+def test_empty_query(mock_retriever):
+    assert "provide" in lookup_policy("   ")
+    mock_retriever.retrieve.assert_not_called()
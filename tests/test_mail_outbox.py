@@ -0,0 +1,104 @@
+# tests/test_mail_outbox.py
+import socket
+import smtplib
+import time
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from sqlalchemy import create_engine
+
+from utils.mail_outbox import FAILED, QUEUED, SENT, MailOutbox
+
+class Sink:
+    """Local SMTP sink recording messages and connections."""
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+        return "250 OK"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def sink():
+    handler = Sink()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+def make_outbox(tmp_path, port, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outbox.db'}")
+    outbox = MailOutbox(engine, lambda: smtplib.SMTP("127.0.0.1", port, timeout=5),
+                        default_sender="support@example.com", **kwargs)
+    outbox.start = lambda: None  # tests drive send_pending() directly
+    return outbox
+
+def test_batch_is_sent_over_one_connection(tmp_path, sink):
+    handler, port = sink
+    outbox = make_outbox(tmp_path, port, batch_size=10)
+    for i in range(3):
+        outbox.enqueue(f"Escalation {i}", [f"user{i}@example.com"], "A human agent will contact you.")
+    assert outbox.send_pending() == 3
+    assert handler.connections == 1
+    assert [rcpt for rcpt, _ in handler.messages] == [["user0@example.com"], ["user1@example.com"], ["user2@example.com"]]
+    assert "Subject: Escalation 0" in handler.messages[0][1]
+    assert outbox.status_counts()[SENT] == 3
+    assert outbox.send_pending() == 0
+
+def test_failures_back_off_then_give_up(tmp_path):
+    outbox = make_outbox(tmp_path, free_port(), max_attempts=2, backoff=0.01)
+    outbox.enqueue("Escalation", ["user@example.com"], "body")
+    assert outbox.send_pending() == 0
+    row = outbox.recent()[0]
+    assert row["status"] == QUEUED and row["attempts"] == 1 and row["last_error"]
+    assert row["next_attempt_at"] > row["created_at"]
+    time.sleep(0.02)
+    outbox.send_pending()
+    assert outbox.recent()[0]["status"] == FAILED
+
+def test_queued_mail_is_delivered_once_smtp_recovers(tmp_path, sink):
+    handler, port = sink
+    outbox = make_outbox(tmp_path, free_port(), backoff=0.01)
+    outbox.enqueue("Escalation", ["user@example.com"], "body")
+    outbox.send_pending()
+    outbox.smtp_factory = lambda: smtplib.SMTP("127.0.0.1", port, timeout=5)
+    time.sleep(0.02)
+    assert outbox.send_pending() == 1
+    assert len(handler.messages) == 1
+
+def test_dropped_connection_requeues_untried_messages(tmp_path):
+    class DropsAfterFirst:
+        def __init__(self):
+            self.sent = 0
+
+        def send_message(self, msg):
+            if self.sent:
+                raise smtplib.SMTPServerDisconnected("connection lost")
+            self.sent += 1
+
+        def quit(self):
+            pass
+
+    outbox = make_outbox(tmp_path, free_port(), batch_size=10)
+    outbox.smtp_factory = DropsAfterFirst
+    for i in range(4):
+        outbox.enqueue(f"Escalation {i}", ["user@example.com"], "body")
+    assert outbox.send_pending() == 1
+    rows = {row["subject"]: row for row in outbox.recent()}
+    assert rows["Escalation 0"]["status"] == SENT
+    assert rows["Escalation 1"]["attempts"] == 1
+    assert [rows[f"Escalation {i}"]["attempts"] for i in (2, 3)] == [0, 0]
+    assert all(rows[f"Escalation {i}"]["status"] == QUEUED for i in (1, 2, 3))
@@ -0,0 +1,56 @@
+# tests/test_pagination.py
+from datetime import datetime, timedelta
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from utils.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_paginate
+
+Base = declarative_base()
+
+class Row(Base):
+    __tablename__ = "row"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    created_at = Column(DateTime)
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        start = datetime(2025, 1, 1)
+        # Pairs of rows share a timestamp so the id tiebreak is exercised
+        session.add_all(Row(id=i, user_id=1, created_at=start + timedelta(minutes=i // 2)) for i in range(1, 26))
+        session.commit()
+        yield session
+
+def test_pages_walk_every_row_once_newest_first(session):
+    seen, after = [], None
+    while True:
+        page = keyset_paginate(session.query(Row).filter_by(user_id=1), Row, after=after, per_page=7)
+        seen.extend(r.id for r in page)
+        if not page.has_next:
+            break
+        after = page.next_cursor
+    assert seen == list(range(25, 0, -1))
+
+def test_before_cursor_returns_previous_page(session):
+    query = session.query(Row).filter_by(user_id=1)
+    first = keyset_paginate(query, Row, per_page=5)
+    second = keyset_paginate(query, Row, after=first.next_cursor, per_page=5)
+    back = keyset_paginate(query, Row, before=second.prev_cursor, per_page=5)
+    assert [r.id for r in back] == [r.id for r in first]
+    assert not back.has_prev and second.has_prev
+
+def test_page_size_is_capped_and_bad_cursor_is_first_page(session):
+    page = keyset_paginate(session.query(Row), Row, after="not-a-cursor", per_page=10_000)
+    assert page.per_page == MAX_PAGE_SIZE
+    assert [r.id for r in page][0] == 25
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 3, 4, 5, 6, 7, 890)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+    assert decode_cursor("") is None
@@ -0,0 +1,26 @@
+# tests/test_policy_index.py
+from rag.bm25 import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    "Customers may request a refund within 30 days of delivery.",
+    "Perishable goods can be refunded within 15 days if spoiled.",
+    "Orders can be cancelled before they are shipped.",
+]
+
+def test_tokenize_keeps_numbers():
+    assert tokenize("Refund in 15 Days!") == ["refund", "in", "15", "days"]
+
+def test_bm25_matches_exact_terms():
+    index = BM25Index.from_texts(CHUNKS)
+    assert index.search("15 days", k=1)[0][0] == 1
+    assert index.search("perishable", k=3) == index.search("perishable", k=1)
+    assert index.search("warranty", k=2) == []
+
+def test_bm25_round_trip():
+    index = BM25Index.from_texts(CHUNKS)
+    restored = BM25Index.from_dict(index.to_dict())
+    assert restored.search("cancelled shipped") == index.search("cancelled shipped")
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    fused = reciprocal_rank_fusion([[0, 1, 2], [1, 2]])
+    assert [idx for idx, _ in fused] == [1, 2, 0]
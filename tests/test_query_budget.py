@@ -0,0 +1,77 @@
+# tests/test_query_budget.py
+import logging
+import pytest
+
+# Budgets are for a warm process: the first GET fills the user, stats and panel caches
+ROUTE_BUDGETS = [
+    ("/", 3),
+    ("/my-tickets", 3),
+    ("/ticket/1", 4),
+    ("/profile", 2),
+    ("/knowledge-base", 5),
+    ("/knowledge-base?search=vpn", 6),
+    ("/knowledge-base/article/1", 3),
+]
+
+@pytest.mark.parametrize("url,budget", ROUTE_BUDGETS)
+def test_portal_route_query_budget(portal_client, max_queries, url, budget):
+    assert portal_client.get(url).status_code == 200
+    with max_queries(budget):
+        assert portal_client.get(url).status_code == 200
+
+def test_ticket_thread_queries_do_not_grow_with_comments(portal_client, max_queries):
+    # Ticket 1 has no comments, ticket 2 has 120 by two authors
+    for url in ("/ticket/1", "/ticket/2", "/ticket/2?comments_per_page=100"):
+        portal_client.get(url)
+        with max_queries(4):
+            assert portal_client.get(url).status_code == 200
+
+def test_comment_thread_pages_oldest_last(portal_client):
+    page = portal_client.get("/ticket/2").get_data(as_text=True)
+    assert "Comments (120)" in page
+    assert "Comment 119" in page and "Comment 69" not in page
+    assert page.index("Comment 70") < page.index("Comment 119")
+    assert "Show older comments" in page
+
+def test_add_comment_returns_new_comment(portal, portal_client, max_queries):
+    with max_queries(3):
+        response = portal_client.post("/ticket/1/comment", data={"content": "Rebooted the router"})
+    assert response.status_code == 200
+    assert response.get_json()["username"] == "alice"
+    assert portal_client.post("/ticket/999/comment", data={"content": "x"}).status_code == 404
+
+def test_repeated_statements_are_reported(caplog):
+    pytest.importorskip("flask")
+    from flask import Flask
+    from sqlalchemy import create_engine, text
+    from utils.query_stats import init_query_stats
+
+    app = Flask(__name__)
+    app.config["QUERY_STATS_HEADERS"] = True
+    init_query_stats(app)
+    engine = create_engine("sqlite://")
+
+    @app.route("/loop")
+    def loop():
+        with engine.connect() as conn:
+            for i in range(6):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return "ok"
+
+    with caplog.at_level(logging.WARNING):
+        response = app.test_client().get("/loop")
+    assert 'desc="6 queries"' in response.headers["Server-Timing"]
+    assert "possible N+1: 6x SELECT ?" in caplog.text
+
+def test_failed_statements_leave_no_state_on_the_connection():
+    from sqlalchemy import create_engine, exc, text
+    from utils.query_stats import count_queries
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn, count_queries() as stats:
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+        conn.execute(text("SELECT 1"))
+        assert not any(key == "_query_started" for key in conn.info)
+    assert stats.count == 1
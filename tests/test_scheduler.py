@@ -0,0 +1,63 @@
+# tests/test_scheduler.py
+from unittest.mock import patch
+from api.scheduler import FairScheduler
+
+def job(job_id, user_id, priority="medium"):
+    return {"id": job_id, "user_id": user_id, "priority": priority}
+
+def drain(scheduler):
+    order = []
+    while scheduler.qsize():
+        order.append(scheduler.get_nowait()["id"])
+    return order
+
+def test_priority_order():
+    scheduler = FairScheduler()
+    scheduler.put_nowait(job("low", 1, "low"))
+    scheduler.put_nowait(job("medium", 1, "medium"))
+    scheduler.put_nowait(job("critical", 1, "critical"))
+    scheduler.put_nowait(job("high", 1, "high"))
+    assert drain(scheduler) == ["critical", "high", "medium", "low"]
+
+def test_fair_share_between_users():
+    """One user's burst does not starve another user in the same class."""
+    scheduler = FairScheduler()
+    for i in range(5):
+        scheduler.put_nowait(job(f"a{i}", "a"))
+    scheduler.put_nowait(job("b0", "b"))
+    scheduler.put_nowait(job("b1", "b"))
+    assert drain(scheduler)[:4] == ["a0", "b0", "a1", "b1"]
+
+def test_user_weights():
+    scheduler = FairScheduler(user_weights={"vip": 2.0})
+    for i in range(4):
+        scheduler.put_nowait(job(f"n{i}", "normal"))
+        scheduler.put_nowait(job(f"v{i}", "vip"))
+    assert drain(scheduler)[:3] == ["v0", "n0", "v1"]
+
+def test_aging_promotes_but_never_past_critical():
+    scheduler = FairScheduler(aging_seconds=10)
+    with patch("api.scheduler.time.monotonic", return_value=0.0):
+        scheduler.put_nowait(job("old-low", 1, "low"))
+    with patch("api.scheduler.time.monotonic", return_value=100.0):
+        scheduler.put_nowait(job("high", 2, "high"))
+        scheduler.put_nowait(job("critical", 3, "critical"))
+        assert drain(scheduler) == ["critical", "old-low", "high"]
+
+def test_unknown_priority_defaults_to_medium():
+    scheduler = FairScheduler()
+    scheduler.put_nowait(job("x", 1, "urgent!!"))
+    assert scheduler.depths() == {"critical": 0, "high": 0, "medium": 1, "low": 0}
+
+def test_async_get_waits_for_put():
+    import asyncio
+
+    async def run():
+        scheduler = FairScheduler()
+        getter = asyncio.create_task(scheduler.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+        await scheduler.put(job("x", 1))
+        return await asyncio.wait_for(getter, 1)
+
+    assert asyncio.run(run())["id"] == "x"
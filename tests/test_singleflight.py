@@ -0,0 +1,73 @@
+# tests/test_singleflight.py
+import asyncio
+import pytest
+from api.singleflight import SingleFlight, resolve_key
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(window=0)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"response": "done"}
+
+    async def run():
+        key = resolve_key(1, "conv_1", "Refund  my ORDER")
+        results = await asyncio.gather(*[flight.do(key, work) for _ in range(5)])
+        assert all(r == {"response": "done"} for r in results)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+def test_finished_calls_are_not_reused_by_default():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        assert await flight.do("k", work) == 1
+        assert await flight.do("k", work) == 2
+
+    asyncio.run(run())
+    assert len(flight) == 0
+
+def test_window_reuses_completed_result():
+    flight = SingleFlight(window=60)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def run():
+        assert await flight.do("k", work) == 1
+        assert await flight.do("k", work) == 1
+        assert await flight.do("other", work) == 2
+
+    asyncio.run(run())
+
+def test_failures_are_not_reused():
+    flight = SingleFlight(window=60)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("LLM timeout")
+        return "ok"
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await flight.do("k", work)
+        assert await flight.do("k", work) == "ok"
+
+    asyncio.run(run())
+
+def test_resolve_key_normalizes_input():
+    assert resolve_key(1, None, " Where is  my order? ") == resolve_key("1", "", "where is my order?")
+    assert resolve_key(1, "a", "hi") != resolve_key(1, "b", "hi")
+    assert resolve_key(1, "a", "yes", turn=2) != resolve_key(1, "a", "yes", turn=4)
@@ -0,0 +1,32 @@
+# tests/test_ttl_cache.py
+import time
+from utils.ttl_cache import TTLCache
+
+def test_get_or_set_computes_once_until_invalidated():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"total": len(calls)}
+
+    assert cache.get_or_set(7, compute) == {"total": 1}
+    assert cache.get_or_set(7, compute) == {"total": 1}
+    cache.invalidate(7)
+    assert cache.get_or_set(7, compute) == {"total": 2}
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(ttl=0.01)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+def test_maxsize_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
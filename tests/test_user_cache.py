@@ -0,0 +1,61 @@
+# tests/test_user_cache.py
+import pytest
+
+pytest.importorskip("flask_sqlalchemy")
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+from utils.user_cache import CachedUserLoader
+
+@pytest.fixture
+def env():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db = SQLAlchemy(app)
+
+    class User(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        username = db.Column(db.String(80))
+        is_active = db.Column(db.Boolean, default=True)
+        notes = db.relationship("Note", backref="user", lazy=True)
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="alice", notes=[Note()]))
+        db.session.commit()
+        db.session.remove()
+        statements = []
+        event.listen(db.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        yield db, User, CachedUserLoader(db, User, ttl=60), statements
+
+def test_cached_hit_issues_no_query_and_stays_usable(env):
+    db, User, loader, statements = env
+    assert loader("1").username == "alice"
+    db.session.remove()
+    statements.clear()
+    user = loader("1")
+    assert statements == []
+    assert user.username == "alice" and len(user.notes) == 1
+
+def test_profile_change_evicts_after_commit(env):
+    db, User, loader, statements = env
+    user = loader(1)
+    user.username = "alice2"
+    db.session.commit()
+    db.session.remove()
+    assert loader(1).username == "alice2"
+
+def test_deactivated_user_is_rejected_immediately(env):
+    db, User, loader, statements = env
+    user = loader(1)
+    user.is_active = False
+    db.session.commit()
+    db.session.remove()
+    assert loader(1) is None
+    assert loader("not-an-id") is None
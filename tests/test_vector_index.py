@@ -0,0 +1,66 @@
+# tests/test_vector_index.py
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+from sqlalchemy import create_engine, text
+
+from utils.vector_index import TableVectorIndex, VectorIndex, from_blob, to_blob
+
+def unit(*values):
+    v = np.array(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_search_orders_by_cosine_and_filters_group():
+    index = VectorIndex(capacity=2)
+    index.upsert(1, unit(1, 0, 0), group=1)
+    index.upsert(2, unit(1, 1, 0), group=2)
+    index.upsert(3, unit(0, 1, 0), group=1)
+    assert [i for i, _ in index.search(unit(1, 0.1, 0), k=3)] == [1, 2, 3]
+    assert [i for i, _ in index.search(unit(1, 0.1, 0), k=3, group=2)] == [2]
+    assert [i for i, _ in index.search(unit(1, 0, 0), k=1, exclude=[1])] == [2]
+
+def test_remove_keeps_remaining_rows_addressable():
+    index = VectorIndex()
+    for i in range(5):
+        index.upsert(i, unit(1, i, 0))
+    index.remove(1)
+    assert len(index) == 4 and 1 not in index
+    assert np.allclose(index.vector(4), unit(1, 4, 0))
+    assert set(index.scores(unit(1, 0, 0), [0, 1, 4])) == {0, 4}
+
+def test_blob_round_trip_is_float16_unit_vector():
+    blob = to_blob([3.0, 4.0])
+    assert len(blob) == 4
+    assert np.allclose(from_blob(blob), [0.6, 0.8], atol=1e-3)
+
+def test_table_index_embeds_and_syncs_between_processes():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE doc (id INTEGER PRIMARY KEY, body TEXT, embedding BLOB, embedded_at REAL)"))
+        conn.execute(text("INSERT INTO doc (id, body) VALUES (1, 'x'), (2, 'y'), (3, 'x y')"))
+
+    def embed(texts):
+        return np.array([[t.count("x"), t.count("y")] for t in texts], dtype=np.float32)
+
+    writer = TableVectorIndex("doc", "body", embed, sync_interval=0)
+    assert writer.backfill(engine.begin, batch_size=2) == 3
+    with engine.connect() as conn:
+        assert writer.pending_ids(conn) == []
+        reader = TableVectorIndex("doc", "body", embed, sync_interval=0)
+        assert reader.sync(conn) == 3
+    assert reader.index.search(unit(1, 0), k=1)[0][0] == 1
+
+def test_sync_drops_rows_deleted_elsewhere():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE doc (id INTEGER PRIMARY KEY, body TEXT, embedding BLOB, embedded_at REAL)"))
+        conn.execute(text("INSERT INTO doc (id, body) VALUES (1, 'x'), (2, 'y')"))
+    index = TableVectorIndex("doc", "body", lambda texts: np.ones((len(texts), 2), dtype=np.float32),
+                             sync_interval=0)
+    index.backfill(engine.begin)
+    with engine.begin() as conn:
+        index.sync(conn)
+        conn.execute(text("DELETE FROM doc WHERE id = 1"))
+        index.sync(conn)
+    assert 1 not in index.index and 2 in index.index
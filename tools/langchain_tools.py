@@ -13,6 +13,7 @@ from tools.trigger_replacement import trigger_replacement
 from tools.place_order import place_order
 from tools.tavily_search import search_web
 from tools.find_orders import find_orders_by_user
+from tools.lookup_policy import lookup_policy
 def format_orders_as_table(orders: List[Dict[str, Any]]) -> str:
     """
     Formats a list of order dictionaries into a series of plain-text paragraphs.
@@ -146,6 +147,14 @@ search_web_tool = Tool(
     description="Search the web for current information or information outside of the order system.",
     func=search_web
 )
+lookup_policy_tool = Tool(
+    name="lookup_policy",
+    description=(
+        "Look up the company's refund policy and FAQs (refund windows, limits, cancellations, "
+        "damaged or missing items). Use this for policy questions instead of search_web."
+    ),
+    func=lookup_policy
+)
 trigger_replacement_tool = StructuredTool.from_function(
     func=trigger_replacement, # Make sure 'trigger_replacement' is imported
     name="trigger_replacement",
@@ -162,6 +171,7 @@ all_tools = [
     place_order_tool,
     escalate_case_tool,
     search_web_tool,
+    lookup_policy_tool,
     # The 'trigger_replacement' tool was in your original code. If you still need it,
     # you would create it the same way as the others:
      trigger_replacement_tool,
@@ -0,0 +1,38 @@
+from functools import lru_cache
+from typing import Tuple
+from rag.policy_index import get_policy_retriever
+
+POLICY_TOP_K = 2
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+@lru_cache(maxsize=512)
+def _cached_lookup(normalized_query: str, k: int) -> Tuple[str, ...]:
+    chunks = get_policy_retriever().retrieve(normalized_query, k=k)
+    return tuple(chunk.page_content.strip() for chunk in chunks)
+
+
+def lookup_policy(query: str) -> str:
+    """
+    Look up the refund policy and FAQs for passages relevant to a question.
+
+    Args:
+        query: The policy question, e.g. "how long do refunds take?"
+
+    Returns:
+        The matching policy passages as plain text, separated by blank lines.
+    """
+    if not query or not query.strip():
+        return "Please provide a policy question."
+    passages = _cached_lookup(_normalize(query), POLICY_TOP_K)
+    if not passages:
+        return "No matching policy was found."
+    return "\n\n".join(passages)
+
+
+def warm_policy_lookup():
+    """Build the shared retriever ahead of the first request."""
+    get_policy_retriever()
@@ -0,0 +1,159 @@
+"""
+Shared HTTP client for calls from the Flask portals to the FastAPI agent.
+
+- One keep-alive requests.Session per process with a bounded connection pool
+- Base URL from AGENT_API_URL (default http://127.0.0.1:8000)
+- Separate connect and read timeouts (AGENT_CONNECT_TIMEOUT / AGENT_READ_TIMEOUT)
+- Jittered exponential-backoff retries, only where a retry cannot duplicate work:
+  idempotent methods, or requests that never reached the server
+- A circuit breaker that fails fast with CircuitOpenError while the API is unhealthy
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures, rejects calls for
+    ``reset_timeout`` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class AgentClient:
+    def __init__(self, base_url=None, connect_timeout=3.05, read_timeout=30.0, retries=2,
+                 backoff=0.25, pool_maxsize=20, breaker=None):
+        self.base_url = (base_url or os.getenv('AGENT_API_URL', 'http://127.0.0.1:8000')).rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _sleep(self, attempt):
+        # Full jitter keeps many portal workers from retrying in lockstep
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def request(self, method, path, idempotent=None, timeout=None, **kwargs):
+        """
+        Send a request to the agent API and return the requests.Response.
+
+        Raises CircuitOpenError while the breaker is open, or the last
+        requests exception once retries are exhausted.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = f'{self.base_url}/{path.lstrip("/")}'
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f'Agent API circuit open; not calling {url}')
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.breaker.record_failure()
+                # A connect failure means the server never saw the request, so any method is safe to retry
+                retryable = idempotent or isinstance(e, requests.exceptions.ConnectTimeout)
+                if not retryable or attempt >= self.retries:
+                    raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.retries:
+                    return response
+            self._sleep(attempt)
+            attempt += 1
+
+    def resolve(self, user_input, user_id, conversation_id=None):
+        payload = {'user_input': user_input, 'user_id': user_id}
+        if conversation_id:
+            payload['conversation_id'] = conversation_id
+        return self.request('POST', '/support/resolve', json=payload)
+
+    def submit_job(self, user_input, user_id, priority=None, callback_url=None):
+        payload = {'user_input': user_input, 'user_id': user_id}
+        if priority:
+            payload['priority'] = priority
+        if callback_url:
+            payload['callback_url'] = callback_url
+        return self.request('POST', '/support/jobs', json=payload, timeout=(self.timeout[0], 5))
+
+    def get_job(self, job_id):
+        return self.request('GET', f'/support/jobs/{job_id}', timeout=(self.timeout[0], 5))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_agent_client():
+    """Process-wide AgentClient configured from AGENT_* environment variables."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AgentClient(
+                    connect_timeout=float(os.getenv('AGENT_CONNECT_TIMEOUT', 3.05)),
+                    read_timeout=float(os.getenv('AGENT_READ_TIMEOUT', 30)),
+                    retries=int(os.getenv('AGENT_RETRIES', 2)),
+                    breaker=CircuitBreaker(
+                        failure_threshold=int(os.getenv('AGENT_BREAKER_THRESHOLD', 5)),
+                        reset_timeout=float(os.getenv('AGENT_BREAKER_RESET', 30)),
+                    ),
+                )
+    return _client
@@ -0,0 +1,120 @@
+"""
+SQLite FTS5 full-text index over the knowledge-base ``article`` table.
+
+``article_fts`` is an external-content FTS5 table: it holds only the inverted
+index and reads title/summary/content back from ``article`` by rowid. Triggers
+keep it in step with every insert, delete and edit of the indexed columns, so
+ORM writes and raw SQL alike stay searchable; view and helpful counter updates
+do not touch the index.
+
+Every function takes anything with ``execute(text(...), params)``: an
+SQLAlchemy Connection, Session or Flask-SQLAlchemy ``db.session``.
+"""
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+# Weights for bm25(): a title hit outranks a summary hit outranks a body hit
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Control characters mark matches in FTS output so the surrounding article
+# text can be HTML-escaped before the markers become <mark> tags
+_HL_START, _HL_END = '\x02', '\x03'
+
+_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5(
+        title, summary, content,
+        content='article', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS article_fts_ai AFTER INSERT ON article BEGIN
+        INSERT INTO article_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, coalesce(new.summary, ''), new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS article_fts_ad AFTER DELETE ON article BEGIN
+        INSERT INTO article_fts(article_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, coalesce(old.summary, ''), old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS article_fts_au AFTER UPDATE OF title, summary, content ON article BEGIN
+        INSERT INTO article_fts(article_fts, rowid, title, summary, content)
+        VALUES ('delete', old.id, old.title, coalesce(old.summary, ''), old.content);
+        INSERT INTO article_fts(rowid, title, summary, content)
+        VALUES (new.id, new.title, coalesce(new.summary, ''), new.content);
+    END""",
+]
+
+
+def ensure_article_fts(bind):
+    """Create the index and its triggers if missing, indexing existing articles on first creation."""
+    exists = bind.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'article_fts'"
+    )).first()
+    for statement in _SCHEMA:
+        bind.execute(text(statement))
+    if not exists:
+        rebuild_article_fts(bind)
+
+
+def rebuild_article_fts(bind):
+    """Re-index every article from scratch, e.g. after a bulk load with triggers disabled."""
+    bind.execute(text("INSERT INTO article_fts(article_fts) VALUES ('rebuild')"))
+
+
+def fts_query(search):
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word must match (implicit AND) and the last word matches as a prefix,
+    so results stay useful while the user is still typing. Returns None when the
+    input has no searchable words.
+    """
+    words = re.findall(r'\w+', search.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _render(fragment):
+    return Markup(str(escape(fragment or ''))
+                  .replace(_HL_START, '<mark>').replace(_HL_END, '</mark>'))
+
+
+def search_articles(bind, search, category_id=None, limit=10, offset=0):
+    """
+    Rank articles matching ``search`` by BM25, optionally within one category.
+
+    Returns (total, hits) where hits is a list of dicts with ``id``, ``score``
+    (lower is better), HTML-safe ``title`` with matches wrapped in <mark>, and an
+    HTML-safe ``snippet`` of the best-matching body passage.
+    """
+    match = fts_query(search)
+    if match is None:
+        return 0, []
+    params = {'match': match, 'category_id': category_id, 'limit': limit, 'offset': offset}
+    where = "article_fts MATCH :match"
+    if category_id is not None:
+        where += " AND a.category_id = :category_id"
+
+    total = bind.execute(text(
+        f"SELECT count(*) FROM article_fts JOIN article a ON a.id = article_fts.rowid WHERE {where}"
+    ), params).scalar()
+    if not total:
+        return 0, []
+
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    rows = bind.execute(text(f"""
+        SELECT article_fts.rowid AS id,
+               bm25(article_fts, {weights}) AS score,
+               highlight(article_fts, 0, '{_HL_START}', '{_HL_END}') AS title,
+               snippet(article_fts, 2, '{_HL_START}', '{_HL_END}', '…', 24) AS snippet
+        FROM article_fts JOIN article a ON a.id = article_fts.rowid
+        WHERE {where}
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """), params).fetchall()
+    hits = [{'id': row.id, 'score': row.score, 'title': _render(row.title), 'snippet': _render(row.snippet)}
+            for row in rows]
+    return total, hits
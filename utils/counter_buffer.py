@@ -0,0 +1,91 @@
+"""
+In-memory buffer for hot counter columns (article views, helpful votes).
+
+Increments are summed per row in process memory and written back in one
+batched UPDATE by a background thread, every ``interval`` seconds or sooner
+once ``threshold`` increments are pending, plus a final flush at interpreter
+exit. Readers see totals that lag by at most one flush interval.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Aggregates ``incr(row_id, field)`` calls and hands the totals to
+    ``flush_fn({row_id: {field: delta}})``. Deltas from a failed flush are kept
+    and retried with the next one.
+    """
+
+    def __init__(self, flush_fn, interval=5.0, threshold=500):
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def incr(self, row_id, field, n=1):
+        with self._lock:
+            self._pending[row_id][field] += n
+            self._count += n
+            full = self._count >= self.threshold
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def pending(self, row_id, field):
+        """Increments for a row not yet written, for read-your-writes display."""
+        with self._lock:
+            row = self._pending.get(row_id)
+            return row.get(field, 0) if row else 0
+
+    def _take(self):
+        with self._lock:
+            batch = {row_id: dict(fields) for row_id, fields in self._pending.items()}
+            self._pending.clear()
+            self._count = 0
+        return batch
+
+    def _restore(self, batch):
+        with self._lock:
+            for row_id, fields in batch.items():
+                for field, n in fields.items():
+                    self._pending[row_id][field] += n
+                    self._count += n
+
+    def flush(self):
+        """Write all pending increments now; returns the number of rows updated."""
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                self.flush_fn(batch)
+            except Exception:
+                logger.exception("Counter flush failed; keeping %d rows for retry", len(batch))
+                self._restore(batch)
+                return 0
+            return len(batch)
+
+    def _ensure_thread(self):
+        # Started lazily so each forked worker process runs its own flusher
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="counter-buffer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
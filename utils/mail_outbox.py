@@ -0,0 +1,213 @@
+"""
+Persistent outbox for outgoing email.
+
+Request handlers call ``enqueue`` which only inserts a row; a background
+thread drains due messages in batches over one reused SMTP connection per
+batch. Failed sends are retried with exponential backoff and jitter until
+``max_attempts``, then marked failed. Rows are claimed atomically, so every
+worker process can run a sender without double-sending.
+"""
+import json
+import logging
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, func, select
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+metadata = MetaData()
+
+outbox_table = Table(
+    'mail_outbox', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('status', String(10), nullable=False, default=QUEUED, index=True),
+    Column('sender', String(255)),
+    Column('recipients', Text, nullable=False),
+    Column('subject', String(255), nullable=False),
+    Column('body', Text, nullable=False),
+    Column('attempts', Integer, nullable=False, default=0),
+    Column('last_error', Text),
+    Column('created_at', Float, nullable=False),
+    Column('next_attempt_at', Float, nullable=False, index=True),
+    Column('claimed_at', Float),
+    Column('sent_at', Float),
+)
+
+
+def smtp_factory_from_config(config):
+    """SMTP connection factory built from Flask-Mail style MAIL_* settings."""
+    def connect():
+        cls = smtplib.SMTP_SSL if config.get('MAIL_USE_SSL') else smtplib.SMTP
+        conn = cls(config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25), timeout=30)
+        if config.get('MAIL_USE_TLS'):
+            conn.starttls()
+        if config.get('MAIL_USERNAME') and config.get('MAIL_PASSWORD'):
+            conn.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        return conn
+    return connect
+
+
+class MailOutbox:
+    def __init__(self, engine, smtp_factory, default_sender=None, batch_size=20, poll_interval=5.0,
+                 max_attempts=6, backoff=30.0, claim_timeout=600.0):
+        self.engine = engine
+        self.smtp_factory = smtp_factory
+        self.default_sender = default_sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.claim_timeout = claim_timeout
+        self._wake = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        metadata.create_all(engine, tables=[outbox_table])
+
+    def enqueue(self, subject, recipients, body, sender=None):
+        """Store a message for delivery and wake the sender; returns the outbox id."""
+        now = time.time()
+        with self.engine.begin() as conn:
+            result = conn.execute(outbox_table.insert().values(
+                status=QUEUED, sender=sender or self.default_sender, recipients=json.dumps(list(recipients)),
+                subject=subject, body=body, attempts=0, created_at=now, next_attempt_at=now,
+            ))
+        self.start()
+        self._wake.set()
+        return result.inserted_primary_key[0]
+
+    def _claim(self):
+        """Atomically mark up to batch_size due rows as sending and return them."""
+        now = time.time()
+        t = outbox_table
+        with self.engine.begin() as conn:
+            # Rows left 'sending' by a crashed process become due again
+            conn.execute(t.update()
+                         .where(t.c.status == SENDING, t.c.claimed_at < now - self.claim_timeout)
+                         .values(status=QUEUED))
+            due = conn.execute(select(t.c.id)
+                               .where(t.c.status == QUEUED, t.c.next_attempt_at <= now)
+                               .order_by(t.c.next_attempt_at)
+                               .limit(self.batch_size)).scalars().all()
+            claimed = []
+            for row_id in due:
+                updated = conn.execute(t.update()
+                                       .where(t.c.id == row_id, t.c.status == QUEUED)
+                                       .values(status=SENDING, claimed_at=now))
+                if updated.rowcount == 1:
+                    claimed.append(row_id)
+            if not claimed:
+                return []
+            return conn.execute(select(t).where(t.c.id.in_(claimed)).order_by(t.c.id)).mappings().all()
+
+    @staticmethod
+    def _message(row):
+        msg = EmailMessage()
+        msg['Subject'] = row['subject']
+        if row['sender']:
+            msg['From'] = row['sender']
+        msg['To'] = ', '.join(json.loads(row['recipients']))
+        msg['Date'] = formatdate(localtime=True)
+        msg['Message-ID'] = make_msgid()
+        msg.set_content(row['body'])
+        return msg
+
+    def _mark_sent(self, row_id):
+        with self.engine.begin() as conn:
+            conn.execute(outbox_table.update().where(outbox_table.c.id == row_id)
+                         .values(status=SENT, sent_at=time.time(), last_error=None))
+
+    def _requeue(self, rows):
+        """Return claimed rows that were never tried to the queue without charging an attempt."""
+        with self.engine.begin() as conn:
+            conn.execute(outbox_table.update()
+                         .where(outbox_table.c.id.in_([row['id'] for row in rows]))
+                         .values(status=QUEUED, claimed_at=None))
+
+    def _mark_failed(self, row, error):
+        attempts = row['attempts'] + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:1000]}
+        if attempts >= self.max_attempts:
+            values['status'] = FAILED
+        else:
+            delay = self.backoff * (2 ** (attempts - 1))
+            values.update(status=QUEUED, next_attempt_at=time.time() + random.uniform(delay / 2, delay))
+        with self.engine.begin() as conn:
+            conn.execute(outbox_table.update().where(outbox_table.c.id == row['id']).values(**values))
+        logger.warning('Outbox message %s failed (attempt %d): %s', row['id'], attempts, error)
+
+    def send_pending(self):
+        """Send one batch of due messages over a single SMTP connection; returns the number sent."""
+        rows = self._claim()
+        if not rows:
+            return 0
+        sent = 0
+        try:
+            conn = self.smtp_factory()
+        except (smtplib.SMTPException, OSError) as e:
+            for row in rows:
+                self._mark_failed(row, e)
+            return 0
+        try:
+            for i, row in enumerate(rows):
+                try:
+                    conn.send_message(self._message(row))
+                except smtplib.SMTPServerDisconnected as e:
+                    # The connection is gone: this message failed, the untried rest go back to the queue
+                    self._mark_failed(row, e)
+                    if rows[i + 1:]:
+                        self._requeue(rows[i + 1:])
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    self._mark_failed(row, e)
+                else:
+                    self._mark_sent(row['id'])
+                    sent += 1
+        finally:
+            try:
+                conn.quit()
+            except (smtplib.SMTPException, OSError):
+                conn.close()
+        return sent
+
+    def start(self):
+        # Started lazily so each forked worker process runs its own sender
+        if self._thread is None or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='mail-outbox', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                while self.send_pending() == self.batch_size:
+                    pass
+            except Exception:
+                logger.exception('Mail outbox sender crashed; retrying')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def status_counts(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(outbox_table.c.status, func.count())
+                                .group_by(outbox_table.c.status)).all()
+        counts = {QUEUED: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def recent(self, limit=50, status=None):
+        query = select(outbox_table).order_by(outbox_table.c.id.desc()).limit(limit)
+        if status:
+            query = query.where(outbox_table.c.status == status)
+        with self.engine.connect() as conn:
+            return conn.execute(query).mappings().all()
@@ -0,0 +1,105 @@
+"""
+Keyset (cursor) pagination for newest-first listings, shared by both Flask apps.
+
+Pages are ordered by (created_at DESC, id DESC) and located with a WHERE on the
+last row seen instead of OFFSET, so with an index on (user_id, created_at, id)
+each page costs the same no matter how many rows a user has.
+
+Cursors are opaque url-safe strings. ``after`` walks to older rows and
+``before`` walks back to newer ones:
+
+    page = keyset_paginate(Ticket.query.filter_by(user_id=uid), Ticket,
+                           after=request.args.get('after'),
+                           before=request.args.get('before'),
+                           per_page=request.args.get('per_page', type=int))
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, row_id):
+    raw = f'{created_at.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, has_next, has_prev):
+        self.items = items
+        self.per_page = per_page
+        self.has_next = has_next
+        self.has_prev = has_prev
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page of older rows (pass as ``after``)."""
+        if not self.has_next or not self.items:
+            return None
+        last = self.items[-1]
+        return encode_cursor(last.created_at, last.id)
+
+    @property
+    def prev_cursor(self):
+        """Cursor for the page of newer rows (pass as ``before``)."""
+        if not self.has_prev or not self.items:
+            return None
+        first = self.items[0]
+        return encode_cursor(first.created_at, first.id)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def clamp_page_size(per_page, default=DEFAULT_PAGE_SIZE):
+    if not per_page or per_page < 1:
+        return default
+    return min(per_page, MAX_PAGE_SIZE)
+
+
+def keyset_paginate(query, model, after=None, before=None, per_page=None, default_per_page=DEFAULT_PAGE_SIZE):
+    """
+    Return one KeysetPage of ``query`` ordered newest first by ``model.created_at, model.id``.
+
+    ``query`` should carry only filters; ordering and limits are applied here.
+    An invalid cursor is treated as no cursor, i.e. the first page.
+    """
+    per_page = clamp_page_size(per_page, default_per_page)
+    created_at, row_id = model.created_at, model.id
+    before_key = decode_cursor(before)
+    after_key = None if before_key else decode_cursor(after)
+
+    if before_key:
+        # Walk towards newer rows in ascending order, then flip back to newest first
+        key_created, key_id = before_key
+        query = query.filter(or_(created_at > key_created,
+                                 and_(created_at == key_created, row_id > key_id)))
+        rows = query.order_by(created_at.asc(), row_id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(items, per_page, has_next=True, has_prev=has_prev)
+
+    if after_key:
+        key_created, key_id = after_key
+        query = query.filter(or_(created_at < key_created,
+                                 and_(created_at == key_created, row_id < key_id)))
+    rows = query.order_by(created_at.desc(), row_id.desc()).limit(per_page + 1).all()
+    return KeysetPage(rows[:per_page], per_page, has_next=len(rows) > per_page, has_prev=after_key is not None)
@@ -0,0 +1,110 @@
+"""
+Per-request SQL query counting and N+1 detection for the Flask apps.
+
+Listens to cursor execution on every SQLAlchemy Engine. Inside a request it
+counts statements and their time in ``flask.g``. After the request it logs a
+warning when the route ran more than ``QUERY_STATS_MAX_QUERIES`` statements,
+spent more than ``QUERY_STATS_MAX_MS`` in the database, or executed the same
+parameterized statement ``QUERY_STATS_REPEAT`` or more times, the usual
+sign of a lazy relationship loaded inside a loop (N+1).
+
+With ``QUERY_STATS_HEADERS`` enabled the totals are also returned in a
+``Server-Timing`` header, visible in the browser's network panel.
+
+``count_queries()`` is the same counter for any block of code, used by the
+test suite's ``max_queries`` fixture.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """(statement, times) pairs executed at least ``threshold`` times, most frequent first."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= threshold]
+
+
+def _active_collectors():
+    collectors = list(getattr(_local, 'collectors', ()))
+    if has_request_context():
+        stats = g.get('_query_stats')
+        if stats is not None:
+            collectors.append(stats)
+    return collectors
+
+
+# The start time lives on the per-statement execution context, so a statement
+# that raises (and never reaches after_cursor_execute) leaves nothing behind
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    for stats in _active_collectors():
+        stats.record(statement, elapsed)
+
+
+@contextmanager
+def count_queries():
+    """Collect QueryStats for every statement run by this thread inside the block."""
+    stats = QueryStats()
+    collectors = _local.__dict__.setdefault('collectors', [])
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+def init_query_stats(app):
+    """Count queries per request in ``app`` and log routes over budget or with N+1 patterns."""
+    app.config.setdefault('QUERY_STATS_MAX_QUERIES', 30)
+    app.config.setdefault('QUERY_STATS_MAX_MS', 200)
+    app.config.setdefault('QUERY_STATS_REPEAT', 5)
+    app.config.setdefault('QUERY_STATS_HEADERS', False)
+
+    @app.before_request
+    def _start_query_stats():
+        g._query_stats = QueryStats()
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.pop('_query_stats', None)
+        if stats is None:
+            return response
+        config = app.config
+        ms = stats.seconds * 1000
+        repeated = stats.repeated(config['QUERY_STATS_REPEAT'])
+        if stats.count > config['QUERY_STATS_MAX_QUERIES'] or ms > config['QUERY_STATS_MAX_MS'] or repeated:
+            app.logger.warning(
+                '%s %s ran %d queries in %.1f ms%s', request.method, request.endpoint, stats.count, ms,
+                ''.join(f'\n  possible N+1: {n}x {" ".join(statement.split())[:200]}'
+                        for statement, n in repeated[:3]))
+        if config['QUERY_STATS_HEADERS']:
+            response.headers.add('Server-Timing', f'db;dur={ms:.1f};desc="{stats.count} queries"')
+        return response
@@ -0,0 +1,62 @@
+"""
+Per-process cache behind Flask-Login's user_loader.
+
+Flask-Login reloads the user on every authenticated request. The loader keeps
+a snapshot of each user's columns in a TTLCache and, on a hit, attaches an
+instance rebuilt from it to the request's session with ``merge(load=False)``,
+which issues no SQL. Relationships still lazy-load normally and changes
+flush as usual.
+
+Any ORM update or delete of a user (profile edit, password change,
+deactivation) evicts that user once the transaction commits. Other worker
+processes pick the change up within ``ttl`` seconds, so keep it short.
+Writes that bypass the ORM must call ``invalidate`` themselves.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from utils.ttl_cache import TTLCache
+
+
+class CachedUserLoader:
+    def __init__(self, db, model, ttl=30.0, maxsize=10000):
+        self.db = db
+        self.model = model
+        self.cache = TTLCache(ttl=ttl, maxsize=maxsize)
+        self._columns = [attr.key for attr in inspect(model).column_attrs]
+        # Session listeners are global, so pending evictions are keyed per loader
+        self._info_key = ('user_cache', id(self))
+        event.listen(model, 'after_update', self._user_changed)
+        event.listen(model, 'after_delete', self._user_changed)
+        event.listen(Session, 'after_commit', self._evict_changed)
+        event.listen(Session, 'after_rollback', self._discard_changed)
+
+    def __call__(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        values = self.cache.get(user_id)
+        if values is not None:
+            user = self.model(**values)
+            make_transient_to_detached(user)
+            return self.db.session.merge(user, load=False)
+        user = self.db.session.get(self.model, user_id)
+        # A deactivated user is never cached, so the session is rejected at once
+        if user is None or not user.is_active:
+            return None
+        self.cache.set(user_id, {key: getattr(user, key) for key in self._columns})
+        return user
+
+    def invalidate(self, user_id):
+        self.cache.invalidate(int(user_id))
+
+    def _user_changed(self, mapper, connection, target):
+        Session.object_session(target).info.setdefault(self._info_key, set()).add(target.id)
+
+    def _evict_changed(self, session):
+        for user_id in session.info.pop(self._info_key, ()):
+            self.cache.invalidate(user_id)
+
+    def _discard_changed(self, session):
+        session.info.pop(self._info_key, None)
@@ -0,0 +1,232 @@
+"""
+Exact cosine top-k over precomputed embeddings stored in the database.
+
+Embeddings are L2-normalized and stored as float16 blobs (768 bytes for a
+384-dim MiniLM vector) in an ``embedding`` column next to an ``embedded_at``
+epoch timestamp. Each process mirrors them into one contiguous float32 matrix,
+so a query is a single BLAS matrix-vector product plus argpartition: about
+20 ms for 100k x 384 on one core, with no extra index service to run.
+(float16 is used on disk only; NumPy float16 matmul is ~10x slower.)
+"""
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+
+def to_blob(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector.astype(np.float16).tobytes()
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Thread-safe in-memory matrix of unit vectors keyed by integer id, with an
+    optional integer group per row (e.g. category) that searches can filter on.
+    Inserts grow the matrix geometrically; removals swap in the last row.
+    """
+
+    def __init__(self, capacity=1024):
+        self._matrix = None
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._groups = np.zeros(capacity, dtype=np.int64)
+        self._pos = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, row_id):
+        return row_id in self._pos
+
+    def _grow(self, dim):
+        capacity = len(self._ids)
+        if self._matrix is None:
+            self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        if self._size < capacity:
+            return
+        capacity *= 2
+        matrix = np.zeros((capacity, dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+        self._ids = np.resize(self._ids, capacity)
+        self._groups = np.resize(self._groups, capacity)
+
+    def upsert(self, row_id, vector, group=None):
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            pos = self._pos.get(row_id)
+            if pos is None:
+                self._grow(len(vector))
+                pos = self._size
+                self._size += 1
+                self._pos[row_id] = pos
+                self._ids[pos] = row_id
+            self._matrix[pos] = vector
+            self._groups[pos] = -1 if group is None else group
+
+    def remove(self, row_id):
+        with self._lock:
+            pos = self._pos.pop(row_id, None)
+            if pos is None:
+                return
+            last = self._size - 1
+            if pos != last:
+                moved = int(self._ids[last])
+                self._matrix[pos] = self._matrix[last]
+                self._ids[pos] = moved
+                self._groups[pos] = self._groups[last]
+                self._pos[moved] = pos
+            self._size = last
+
+    def ids(self):
+        with self._lock:
+            return [int(row_id) for row_id in self._ids[:self._size]]
+
+    def vector(self, row_id):
+        with self._lock:
+            pos = self._pos.get(row_id)
+            return None if pos is None else self._matrix[pos].copy()
+
+    def search(self, query, k=10, group=None, exclude=()):
+        """Return up to k (id, cosine) pairs, best first, optionally within one group."""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if not self._size:
+                return []
+            scores = self._matrix[:self._size] @ query
+            if group is not None:
+                scores[self._groups[:self._size] != group] = -np.inf
+            for row_id in exclude:
+                pos = self._pos.get(row_id)
+                if pos is not None:
+                    scores[pos] = -np.inf
+            ids = self._ids[:self._size]
+            k = min(k, self._size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def scores(self, query, row_ids):
+        """Cosine similarity for specific ids; ids without a vector are omitted."""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            positions = [(row_id, self._pos[row_id]) for row_id in row_ids if row_id in self._pos]
+            if not positions:
+                return {}
+            values = self._matrix[[pos for _, pos in positions]] @ query
+        return {row_id: float(value) for (row_id, _), value in zip(positions, values)}
+
+
+class TableVectorIndex:
+    """
+    A VectorIndex mirroring the ``embedding``/``embedded_at`` columns of one table.
+
+    ``embed_rows`` computes and stores embeddings for given ids; ``sync`` pulls
+    rows embedded by any process since the last sync (at most every
+    ``sync_interval`` seconds) and drops rows deleted since. ``text_sql`` is the SQL expression embedded per
+    row and ``group_column`` an optional integer column searches can filter on.
+    ``embed_fn(texts)`` must return an (n, dim) array of vectors.
+    """
+
+    # Re-read this much history on each sync so rows committed slightly out of
+    # timestamp order by other processes are not skipped
+    SYNC_OVERLAP = 60.0
+
+    def __init__(self, table, text_sql, embed_fn, group_column=None, sync_interval=30.0):
+        self.table = table
+        self.text_sql = text_sql
+        self.embed_fn = embed_fn
+        self.group_column = group_column
+        self.sync_interval = sync_interval
+        self.index = VectorIndex()
+        self._synced_through = None
+        self._last_sync = 0.0
+        self._sync_lock = threading.Lock()
+
+    def _group_sql(self):
+        return self.group_column or 'NULL'
+
+    def sync(self, bind, force=False):
+        """Load embeddings written since the last sync; returns the number of rows loaded."""
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return 0
+        with self._sync_lock:
+            since = self._synced_through
+            sql = (f"SELECT id, {self._group_sql()} AS grp, embedding, embedded_at FROM {self.table} "
+                   f"WHERE embedding IS NOT NULL")
+            params = {}
+            if since is not None:
+                sql += " AND embedded_at > :since"
+                params['since'] = since - self.SYNC_OVERLAP
+            loaded = 0
+            for row in bind.execute(text(sql), params):
+                self.index.upsert(row.id, from_blob(row.embedding), row.grp)
+                if self._synced_through is None or row.embedded_at > self._synced_through:
+                    self._synced_through = row.embedded_at
+                loaded += 1
+            if since is not None:
+                # Deletes leave no timestamp behind, so compare against the ids still present
+                live = {row.id for row in bind.execute(text(f"SELECT id FROM {self.table}"))}
+                for row_id in self.index.ids():
+                    if row_id not in live:
+                        self.index.remove(row_id)
+            if self._synced_through is None:
+                self._synced_through = 0.0
+            self._last_sync = time.monotonic()
+            return loaded
+
+    def pending_ids(self, bind, include_embedded=False):
+        sql = f"SELECT id FROM {self.table}"
+        if not include_embedded:
+            sql += " WHERE embedding IS NULL"
+        return [row.id for row in bind.execute(text(sql + " ORDER BY id"))]
+
+    def embed_rows(self, bind, row_ids):
+        """Embed and store the given rows, updating this process's index; returns the vectors by id."""
+        if not row_ids:
+            return {}
+        rows = bind.execute(
+            text(f"SELECT id, {self._group_sql()} AS grp, {self.text_sql} AS body FROM {self.table} "
+                 f"WHERE id IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(row_ids)},
+        ).fetchall()
+        if not rows:
+            return {}
+        vectors = np.asarray(self.embed_fn([row.body or '' for row in rows]), dtype=np.float32)
+        now = time.time()
+        bind.execute(
+            text(f"UPDATE {self.table} SET embedding = :embedding, embedded_at = :embedded_at WHERE id = :id"),
+            [{'id': row.id, 'embedding': to_blob(vector), 'embedded_at': now} for row, vector in zip(rows, vectors)],
+        )
+        result = {}
+        for row, vector in zip(rows, vectors):
+            vector = from_blob(to_blob(vector))
+            self.index.upsert(row.id, vector, row.grp)
+            result[row.id] = vector
+        return result
+
+    def backfill(self, bind_factory, include_embedded=False, batch_size=256, progress=None):
+        """
+        Embed every row missing an embedding (or every row) in batches.
+
+        ``bind_factory`` returns a context manager yielding a connection that
+        commits on exit, e.g. ``engine.begin``, so each batch is durable.
+        """
+        with bind_factory() as bind:
+            row_ids = self.pending_ids(bind, include_embedded)
+        for start in range(0, len(row_ids), batch_size):
+            with bind_factory() as bind:
+                self.embed_rows(bind, row_ids[start:start + batch_size])
+            if progress:
+                progress(min(start + batch_size, len(row_ids)), len(row_ids))
+        return len(row_ids)